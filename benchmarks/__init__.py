@@ -0,0 +1 @@
+"""Download throughput benchmarks; see benchmarks/run.py."""
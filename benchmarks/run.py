@@ -0,0 +1,330 @@
+"""Download throughput benchmarks.
+
+Runs the download engine against benchmarks/server.py for a matrix of
+file size mixes (scenarios), server profiles, engines and concurrency
+levels, and reports throughput, time to completion and CPU use of the
+downloading process. Results are saved as JSON, so runs of different
+versions can be compared:
+
+    python -m benchmarks.run --scenarios small mixed --concurrency 1 4 8
+    python -m benchmarks.run --compare benchmarks/results/old.json benchmarks/results/new.json
+
+Run from the plugin folder. The server runs in a separate process, so its
+CPU time is not counted. Quota, journal and settings of the user are not
+touched: every case downloads into a temporary folder with the default
+download settings plus the case's overrides.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import urllib.request
+from pathlib import Path
+
+from downloads import async_engine, quota
+from downloads.engine import create_download_engine, set_log_handler
+from downloads.settings import DEFAULT_SETTINGS
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+KB = 1024
+MB = 1024 ** 2
+
+# Product sizes of each scenario
+SCENARIOS = {
+    "small": [256 * KB] * 200,
+    "large": [64 * MB] * 4,
+    "mixed": [64 * MB] * 2 + [4 * MB] * 20 + [128 * KB] * 100,
+}
+
+# Arguments of benchmarks.server
+PROFILES = {
+    "lan": [],
+    "wan": ["--latency", "0.05", "--bandwidth-mb", "20"],
+    "flaky": ["--latency", "0.05", "--bandwidth-mb", "20", "--fail-rate", "0.05", "--seed", "1"],
+    "norange": ["--latency", "0.05", "--bandwidth-mb", "20", "--no-range"],
+}
+
+# Settings of every case: retries without long waits, orders ready at once
+BASE_OVERRIDES = {
+    "retry_base_delay": 0.05,
+    "retry_max_delay": 1.0,
+    "order_poll_interval": 0.01,
+    "store": False,
+}
+
+# Throughput loss that counts as a regression in --compare
+DEFAULT_THRESHOLD = 0.10
+
+
+class LocalOrderClient:
+    """Answers the order calls of the engine like HDA, for products on the local server."""
+
+    token = "benchmark"
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def post(self, query, action):
+        return {"download_id": f"{query['product_id']}/{query['location']}"}
+
+    def head(self, action, download_id):
+        return types.SimpleNamespace(status_code=200)
+
+    def full_url(self, path):
+        download_id = path.split("/", 2)[2]
+        return f"{self.base_url}/products/{download_id}"
+
+
+def make_matches(sizes):
+    matches = []
+    for index, size in enumerate(sizes):
+        feature = {
+            "id": f"product-{index:04d}",
+            "properties": {"size": size, "location": str(size)},
+        }
+        matches.append(types.SimpleNamespace(dataset="EO:BENCHMARK", results=[feature]))
+    return matches
+
+
+def start_server(profile):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.server"] + PROFILES[profile],
+        cwd=str(PLUGIN_DIR),
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    line = process.stdout.readline().split()
+    if len(line) != 2 or line[0] != "PORT":
+        process.kill()
+        raise RuntimeError(f"benchmark server did not start: {line}")
+    return process, f"http://127.0.0.1:{line[1]}"
+
+
+def server_stats(base_url):
+    with urllib.request.urlopen(f"{base_url}/stats", timeout=10) as response:
+        return json.load(response)
+
+
+def concurrency_settings(level):
+    """Settings of a concurrency level: a number fixes it, "adaptive" uses the defaults."""
+    if level == "adaptive":
+        return {}
+    level = int(level)
+    return {"concurrency_floor": level, "concurrency_ceiling": level}
+
+
+def run_case(base_url, scenario, engine_name, level, extra):
+    settings = dict(DEFAULT_SETTINGS, **BASE_OVERRIDES)
+    settings.update(concurrency_settings(level))
+    settings.update(extra)
+    settings["engine"] = engine_name
+    matches = make_matches(SCENARIOS[scenario])
+    out_dir = tempfile.mkdtemp(prefix="hda-benchmark-")
+    try:
+        engine = create_download_engine(
+            matches,
+            LocalOrderClient(base_url),
+            {"dataset_id": "EO:BENCHMARK"},
+            {match.results[0]["id"] for match in matches},
+            out_dir,
+            settings=settings,
+        )
+        # The hourly quota would pace large scenarios; it is not what is measured
+        engine.quota = quota.QuotaScheduler(limit=10 ** 9)
+        before = server_stats(base_url)
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        engine.run()
+        seconds = time.perf_counter() - wall_start
+        cpu_seconds = time.process_time() - cpu_start
+        after = server_stats(base_url)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    total = sum(SCENARIOS[scenario])
+    return {
+        "products": len(matches),
+        "bytes": total,
+        "completed": engine.completed_downloads,
+        "seconds": round(seconds, 3),
+        "mb_per_s": round(total / MB / seconds, 2) if seconds else None,
+        "cpu_seconds": round(cpu_seconds, 3),
+        "cpu_percent": round(100 * cpu_seconds / seconds, 1) if seconds else None,
+        "requests": after["requests"] - before["requests"],
+        "injected_failures": after["failures"] - before["failures"],
+    }
+
+
+def summarize(runs):
+    """Median of the repetitions of one case."""
+    summary = dict(runs[0])
+    for key in ("seconds", "mb_per_s", "cpu_seconds", "cpu_percent"):
+        values = [run[key] for run in runs if run[key] is not None]
+        summary[key] = round(statistics.median(values), 3) if values else None
+    summary["completed"] = min(run["completed"] for run in runs)
+    summary["repeat"] = len(runs)
+    return summary
+
+
+def plugin_version():
+    try:
+        with open(PLUGIN_DIR / "metadata.txt", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("version="):
+                    return line.split("=", 1)[1].strip()
+    except OSError:
+        pass
+    return "unknown"
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=str(PLUGIN_DIR), capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def case_key(case):
+    return (case["scenario"], case["profile"], case["engine"], str(case["concurrency"]))
+
+
+def print_case(case):
+    print(
+        f"{case['scenario']:<7} {case['profile']:<8} {case['engine']:<8} {str(case['concurrency']):>8} "
+        f"{case['seconds']:>8.2f} s {case['mb_per_s'] or 0:>8.1f} MB/s "
+        f"cpu {case['cpu_percent'] or 0:>5.1f}% {case['completed']}/{case['products']}",
+        flush=True,
+    )
+
+
+def compare(base_path, new_path, threshold):
+    """Print the throughput change per case. Returns True when nothing regressed."""
+    with open(base_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    base_cases = {case_key(case): case for case in base["cases"]}
+    print(f"{base.get('version')} ({base.get('commit')}) -> {new.get('version')} ({new.get('commit')})")
+    ok = True
+    for case in new["cases"]:
+        old = base_cases.get(case_key(case))
+        if old is None or not old.get("mb_per_s") or not case.get("mb_per_s"):
+            continue
+        change = case["mb_per_s"] / old["mb_per_s"] - 1
+        regressed = change < -threshold or case["completed"] < old["completed"]
+        ok = ok and not regressed
+        print(
+            f"{' '.join(case_key(case)):<40} {old['mb_per_s']:>8.1f} -> {case['mb_per_s']:>8.1f} MB/s "
+            f"{change:+7.1%}{'  REGRESSION' if regressed else ''}"
+        )
+    return ok
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the download engine against a local server.")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=["small", "mixed"])
+    parser.add_argument("--profiles", nargs="+", choices=sorted(PROFILES), default=["lan", "wan"])
+    parser.add_argument("--engines", nargs="+", choices=["threads", "asyncio"], default=["threads", "asyncio"])
+    parser.add_argument("--concurrency", nargs="+", default=["1", "4", "8", "adaptive"],
+                        help="fixed numbers of parallel transfers, or adaptive")
+    parser.add_argument("--set", dest="overrides", metavar="KEY=VALUE", action="append", default=[],
+                        help="download setting for all cases, e.g. --set segmented=true")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case; the median is reported")
+    parser.add_argument("--output", type=Path, default=None, help="results file (default: benchmarks/results/)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two results files")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="throughput loss reported as a regression (default: 0.10)")
+    parser.add_argument("--verbose", action="store_true", help="show the engine log")
+    return parser
+
+
+def parse_overrides(items):
+    overrides = {}
+    for item in items:
+        key, _, value = item.partition("=")
+        if key not in DEFAULT_SETTINGS:
+            raise SystemExit(f"unknown download setting {key!r}")
+        try:
+            overrides[key] = json.loads(value)
+        except ValueError:
+            overrides[key] = value
+    return overrides
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.compare:
+        return 0 if compare(args.compare[0], args.compare[1], args.threshold) else 1
+
+    if not args.verbose:
+        set_log_handler(lambda *_: None)
+    overrides = parse_overrides(args.overrides)
+    engines = [name for name in args.engines if name != "asyncio" or async_engine.AVAILABLE]
+    if len(engines) < len(args.engines):
+        print("aiohttp is not installed, skipping the asyncio engine", file=sys.stderr)
+
+    # Keep the benchmark's downloads out of the user's quota history
+    scratch = tempfile.mkdtemp(prefix="hda-benchmark-state-")
+    quota.STATUS_PATH = Path(scratch) / ".hda_download_status"
+
+    cases = []
+    try:
+        for profile in args.profiles:
+            process, base_url = start_server(profile)
+            try:
+                for scenario in args.scenarios:
+                    for engine_name in engines:
+                        for level in args.concurrency:
+                            runs = [
+                                run_case(base_url, scenario, engine_name, level, overrides)
+                                for _ in range(max(1, args.repeat))
+                            ]
+                            case = dict(scenario=scenario, profile=profile, engine=engine_name,
+                                        concurrency=level, **summarize(runs))
+                            print_case(case)
+                            cases.append(case)
+            finally:
+                process.terminate()
+                process.wait()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    version = plugin_version()
+    commit = git_commit()
+    results = {
+        "version": version,
+        "commit": commit,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": overrides,
+        "cases": cases,
+    }
+    output = args.output
+    if output is None:
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = RESULTS_DIR / f"{stamp}-{version}{'-' + commit if commit else ''}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""Local HTTP stand-in for the HDA download service.
+
+Serves synthetic products at /products/<id>/<size>: `size` bytes of a
+fixed pattern, so nothing is kept in memory or on disk. The behaviour of
+the network and the server is configurable: latency before every
+response, a bandwidth cap per connection, Range support, and a share of
+requests answered with 5xx/429 and a Retry-After header. /stats returns
+the request counters as JSON.
+
+    python -m benchmarks.server --latency 0.05 --bandwidth-mb 20 --fail-rate 0.05
+
+prints "PORT <port>" once it listens.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Pattern repeated to fill the products
+BLOCK = b"".join(hashlib.sha256(str(index).encode()).digest() for index in range(2048))
+# Bytes written per send
+SEND_SIZE = 64 * 1024
+
+_PATH_RE = re.compile(r"^/products/([^/]+)/(\d+)$")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def product_bytes(start, end):
+    """Bytes start..end (inclusive) of every synthetic product."""
+    length = end - start + 1
+    offset = start % len(BLOCK)
+    repeats = (offset + length) // len(BLOCK) + 1
+    return (BLOCK * repeats)[offset:offset + length]
+
+
+class ServerConfig:
+    def __init__(self, latency=0.0, bandwidth=None, ranges=True, fail_rate=0.0,
+                 fail_statuses=(503, 429), retry_after=0, seed=None):
+        self.latency = latency
+        # Bytes per second per connection, None for no cap
+        self.bandwidth = bandwidth
+        self.ranges = ranges
+        self.fail_rate = fail_rate
+        self.fail_statuses = tuple(fail_statuses)
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+
+class ProductHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.server.stats_lock:
+                payload = json.dumps(self.server.stats).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        self.respond(body=True)
+
+    def count(self, key, amount=1):
+        with self.server.stats_lock:
+            self.server.stats[key] = self.server.stats.get(key, 0) + amount
+
+    def respond(self, body):
+        config = self.server.config
+        self.count("requests")
+        match = _PATH_RE.match(self.path.split("?")[0])
+        if match is None:
+            self.send_error(404)
+            return
+        product_id, size = match.group(1), int(match.group(2))
+        if config.latency:
+            time.sleep(config.latency)
+
+        with self.server.stats_lock:
+            fail = config.fail_rate and config.random.random() < config.fail_rate
+            status = config.random.choice(config.fail_statuses) if fail else None
+        if fail:
+            self.count("failures")
+            self.send_response(status)
+            self.send_header("Retry-After", str(config.retry_after))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, end = 0, size - 1
+        requested = self.headers.get("Range")
+        partial = False
+        if requested and config.ranges:
+            range_match = _RANGE_RE.match(requested.strip())
+            if range_match and (range_match.group(1) or range_match.group(2)):
+                first, last = range_match.groups()
+                if first:
+                    start, end = int(first), min(int(last), size - 1) if last else size - 1
+                else:
+                    start, end = max(0, size - int(last)), size - 1
+                if start >= size:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                partial = True
+
+        self.send_response(206 if partial else 200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", f'"{product_id}-{size}"')
+        if config.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if partial:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if body:
+            self.send_body(start, end)
+
+    def send_body(self, start, end):
+        bandwidth = self.server.config.bandwidth
+        began = time.monotonic()
+        sent = 0
+        position = start
+        try:
+            while position <= end:
+                last = min(end, position + SEND_SIZE - 1)
+                self.wfile.write(product_bytes(position, last))
+                sent += last - position + 1
+                position = last + 1
+                if bandwidth:
+                    ahead = sent / bandwidth - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.count("bytes", sent)
+
+
+def start_server(config, host="127.0.0.1", port=0):
+    """Serve on a background thread. Returns the server; its port is server.server_port."""
+    server = ThreadingHTTPServer((host, port), ProductHandler)
+    server.daemon_threads = True
+    server.config = config
+    server.stats = {"requests": 0, "failures": 0, "bytes": 0}
+    server.stats_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve synthetic HDA products for benchmarks.")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before every response")
+    parser.add_argument("--bandwidth-mb", type=float, default=0, help="MB/s per connection (0: no cap)")
+    parser.add_argument("--no-range", action="store_true", help="ignore Range requests")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument("--fail-statuses", default="503,429", help="comma separated error statuses")
+    parser.add_argument("--retry-after", type=int, default=0, help="Retry-After seconds of the errors")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    config = ServerConfig(
+        latency=args.latency,
+        bandwidth=args.bandwidth_mb * 1024 ** 2 or None,
+        ranges=not args.no_range,
+        fail_rate=args.fail_rate,
+        fail_statuses=[int(status) for status in args.fail_statuses.split(",") if status.strip()],
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    server = start_server(config, port=args.port)
+    print(f"PORT {server.server_port}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
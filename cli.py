@@ -0,0 +1,230 @@
+"""Command line downloader for batch jobs without QGIS.
+
+Runs a search with a query in the JSON format of "Show API Request(s)"
+and downloads the results with the plugin's download engine: the same
+retries, quota pacing, concurrency, journal and download settings.
+
+    python cli.py query.json --out /data/wekeo --limit 200
+
+Progress is written to stdout as one JSON object per line, e.g.
+{"event": "transfer", "percent": 42.0, ...}; log messages go to stderr.
+Credentials come from HDA_USER / HDA_PASSWORD or ~/.hdarc. Exit status:
+0 when every product is on disk, 1 when some failed, 2 on usage, search
+or login errors and 130 when cancelled with Ctrl+C or SIGTERM.
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+
+from hda import Client, Configuration
+from hda.api import SearchResults
+
+try:
+    from .downloads import ratelimit
+    from .downloads.engine import EngineSignals, create_download_engine, set_log_handler
+    from .downloads.settings import DEFAULT_SETTINGS, load_download_settings
+    from .search import strategy, tiles
+    from .search.settings import DEFAULT_SETTINGS as DEFAULT_SEARCH_SETTINGS, load_search_settings
+except ImportError:
+    from downloads import ratelimit
+    from downloads.engine import EngineSignals, create_download_engine, set_log_handler
+    from downloads.settings import DEFAULT_SETTINGS, load_download_settings
+    from search import strategy, tiles
+    from search.settings import DEFAULT_SETTINGS as DEFAULT_SEARCH_SETTINGS, load_search_settings
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_ERROR = 2
+EXIT_CANCELLED = 130
+
+# Same default as the plugin; HDA_TIMEOUT overrides it
+try:
+    DEFAULT_CLIENT_TIMEOUT = int(os.environ.get("HDA_TIMEOUT", "60"))
+except ValueError:
+    DEFAULT_CLIENT_TIMEOUT = 60
+
+
+def default_download_path():
+    """The download folder chosen in the plugin, or ~/HDA_Downloads."""
+    pathfile = Path.home() / ".hda_path"
+    if pathfile.is_file():
+        with open(pathfile, 'r') as f:
+            return Path(f.read().strip())
+    return Path.home() / "HDA_Downloads"
+
+
+def parse_setting(text):
+    """Parse a KEY=VALUE override of a download or search setting; VALUE is JSON or a plain string."""
+    key, separator, value = text.partition("=")
+    key = key.strip()
+    if not separator or (key not in DEFAULT_SETTINGS and key not in DEFAULT_SEARCH_SETTINGS):
+        raise argparse.ArgumentTypeError(f"unknown setting {key!r}")
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return key, value
+
+
+def read_query(path):
+    if path == "-":
+        query = json.load(sys.stdin)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            query = json.load(f)
+    if not isinstance(query, dict) or not query.get("dataset_id"):
+        raise ValueError("the query must be a JSON object with a dataset_id")
+    return query
+
+
+class EventWriter:
+    """Writes engine events as JSON lines, at most one transfer event per `interval` seconds."""
+
+    def __init__(self, stream=sys.stdout, interval=5.0):
+        self.stream = stream
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._last_transfer = 0.0
+
+    def write(self, event, **fields):
+        fields = dict(event=event, time=round(time.time(), 3), **fields)
+        line = json.dumps(fields, default=str)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def transfer(self, snapshot):
+        now = time.monotonic()
+        if now - self._last_transfer < self.interval and snapshot.get("percent") != 100:
+            return
+        self._last_transfer = now
+        self.write("transfer", **snapshot)
+
+    def connect(self, signals):
+        signals.transfer.connect(self.transfer)
+        signals.status.connect(lambda message: self.write("status", message=message))
+        signals.concurrency.connect(lambda level: self.write("concurrency", level=level))
+        signals.error.connect(lambda message: self.write("error", message=message))
+
+
+def log_to_stderr(msg, tag="Copernicus Connect", level="INFO"):
+    print(f"[{level}] {tag}: {msg}", file=sys.stderr, flush=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Search WEkEO and download the results without QGIS.",
+    )
+    parser.add_argument("query", help="query JSON file as shown by 'Show API Request(s)', or - for stdin")
+    parser.add_argument("--out", type=Path, default=None, help="download folder (default: the plugin's download folder)")
+    parser.add_argument("--limit", type=int, default=None, help="maximum number of search results")
+    parser.add_argument("--ids", nargs="+", default=None, help="download only these product ids")
+    parser.add_argument("--set", dest="overrides", metavar="KEY=VALUE", type=parse_setting, action="append", default=[],
+                        help="override a download or search setting for this run, e.g. --set engine=asyncio")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between two transfer events (default: 5)")
+    parser.add_argument("--dry-run", action="store_true", help="search and list the products without downloading")
+    parser.add_argument("--quiet", action="store_true", help="do not write log messages to stderr")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    events = EventWriter(interval=args.interval)
+    set_log_handler((lambda *_: None) if args.quiet else log_to_stderr)
+
+    overrides = dict(args.overrides)
+    settings = load_download_settings()
+    settings.update({key: value for key, value in overrides.items() if key in DEFAULT_SETTINGS})
+    search_settings = load_search_settings()
+    search_settings.update({key: value for key, value in overrides.items() if key in DEFAULT_SEARCH_SETTINGS})
+    ratelimit.get_limiter().configure(settings["bandwidth_limit_mb"] * 1024 ** 2, settings["bandwidth_schedule"])
+    if settings["bandwidth_schedule"] and not settings["bandwidth_limit_mb"] and not args.quiet:
+        log_to_stderr("The bandwidth schedule has no effect without bandwidth_limit_mb", level="WARNING")
+
+    try:
+        query = read_query(args.query)
+        client = Client(config=Configuration())
+        client.timeout = DEFAULT_CLIENT_TIMEOUT
+        features = []
+        minutes = float(search_settings["timeout_minutes"] or 0)
+        deadline = time.monotonic() + minutes * 60 if minutes > 0 else None
+
+        def expired():
+            return deadline is not None and time.monotonic() > deadline
+
+        try:
+            for page, _ in strategy.run_search(client, query, args.limit, search_settings, cancelled=expired):
+                features.extend(page)
+            if expired():
+                raise TimeoutError(f"Search timed out after {minutes:g} minutes")
+        except tiles.PartialSearchError as e:
+            # Download what the tiles that worked found
+            events.write("error", message=str(e))
+        results = SearchResults(client, features, query["dataset_id"])
+    except Exception as e:
+        events.write("error", message=f"{type(e).__name__}: {e}")
+        return EXIT_ERROR
+
+    products = [match.results[0] for match in results]
+    events.write(
+        "search",
+        dataset_id=query["dataset_id"],
+        results=len(products),
+        volume=getattr(results, "volume", None),
+        limit_reached=args.limit is not None and len(products) >= args.limit,
+    )
+    wanted = set(args.ids) if args.ids else None
+    selected_ids = [feature["id"] for feature in products if wanted is None or feature["id"] in wanted]
+    if args.dry_run:
+        for feature in products:
+            if feature["id"] in selected_ids:
+                events.write("product", id=feature["id"], size=feature.get("properties", {}).get("size"))
+        return EXIT_OK
+    if not selected_ids:
+        events.write("finished", selected=0, completed=0, skipped=0, stored=0, unfinished=0, cancelled=False)
+        return EXIT_OK
+
+    out_dir = args.out or default_download_path()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    signals = EngineSignals()
+    events.connect(signals)
+    engine = create_download_engine(results, client, query, set(selected_ids), out_dir, signals=signals, settings=settings)
+
+    def cancel(signum, frame):
+        engine.cancel()
+
+    signal.signal(signal.SIGINT, cancel)
+    signal.signal(signal.SIGTERM, cancel)
+    # The engine runs on its own thread so the main thread can take signals
+    runner = threading.Thread(target=engine.run, name="download-engine")
+    runner.start()
+    while runner.is_alive():
+        runner.join(0.5)
+
+    done = engine.completed_downloads + engine.skipped_downloads + engine.stored_downloads
+    events.write(
+        "finished",
+        out_dir=str(out_dir),
+        batch_id=engine.batch_id,
+        selected=len(selected_ids),
+        completed=engine.completed_downloads,
+        skipped=engine.skipped_downloads,
+        stored=engine.stored_downloads,
+        unfinished=len(selected_ids) - done,
+        cancelled=engine.cancelled,
+        partial=engine.partial_downloads,
+        partial_bytes=engine.partial_bytes,
+    )
+    if engine.cancelled:
+        return EXIT_CANCELLED
+    return EXIT_OK if done == len(selected_ids) else EXIT_FAILED
+
+
+if __name__ == "__main__":
+    sys.exit(main())
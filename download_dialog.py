@@ -0,0 +1,152 @@
+import os
+
+try:
+    from .qt_compat import QDialog, QIcon, QMessageBox, QStyle, QTime, uic
+    from .downloads.settings import load_download_settings, save_download_settings
+    from .downloads import async_engine
+except ImportError:
+    from qt_compat import QDialog, QIcon, QMessageBox, QStyle, QTime, uic
+    from downloads.settings import load_download_settings, save_download_settings
+    from downloads import async_engine
+
+DOWNLOAD_UI_PATH = os.path.join(os.path.dirname(__file__), "resources", "download_dialog.ui")
+
+FORM_CLASS, _ = uic.loadUiType(DOWNLOAD_UI_PATH)
+
+# Used when the bandwidth schedule is switched on for the first time
+DEFAULT_SCHEDULE = {"days": "weekdays", "start": "08:00", "end": "18:00", "percent": 50}
+
+ORDERS = [
+    ("user", "In the order of the results"),
+    ("largest", "Largest first (finishes the batch soonest)"),
+    ("smallest", "Smallest first (many files early)"),
+]
+
+ENGINES = [
+    ("threads", "Threads (large products)"),
+    ("asyncio", "asyncio (many small products)"),
+]
+
+
+class DownloadDialog(QDialog, FORM_CLASS):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setupUi(self)
+
+        icon_path = os.path.join(os.path.dirname(__file__), 'resources', 'icon.png')
+        self.setWindowIcon(QIcon(icon_path))
+
+        self.settings = load_download_settings()
+        for key, label in ENGINES:
+            self.comboEngine.addItem(label, key)
+        self.comboEngine.setCurrentIndex(max(0, self.comboEngine.findData(self.settings["engine"])))
+        for key, label in ORDERS:
+            self.comboOrder.addItem(label, key)
+        self.comboOrder.setCurrentIndex(max(0, self.comboOrder.findData(self.settings["order"])))
+        if not async_engine.AVAILABLE:
+            self.comboEngine.setToolTip("The asyncio engine needs the aiohttp package; without it, threads are used.")
+        self.spinFloor.setValue(int(self.settings["concurrency_floor"]))
+        self.spinCeiling.setValue(int(self.settings["concurrency_ceiling"]))
+        self.spinOrderParallel.setValue(int(self.settings["order_parallel"]))
+        schedule = self.settings["bandwidth_schedule"]
+        entry = dict(DEFAULT_SCHEDULE, **(schedule[0] if schedule else {}))
+        self.checkSchedule.setChecked(bool(schedule))
+        if not self.settings["bandwidth_limit_mb"]:
+            self.checkSchedule.setToolTip("The schedule scales the bandwidth limit set in the main window; without a limit it has no effect.")
+        self.timeStart.setTime(QTime.fromString(entry["start"], "HH:mm"))
+        self.timeEnd.setTime(QTime.fromString(entry["end"], "HH:mm"))
+        self.spinSchedulePercent.setValue(int(entry["percent"]))
+        self.checkScheduleWeekdays.setChecked(entry["days"] == "weekdays")
+        self.checkSegmented.setChecked(bool(self.settings["segmented"]))
+        self.spinSegments.setValue(int(self.settings["segments"]))
+        self.spinThreshold.setValue(int(self.settings["segment_threshold_mb"]))
+        self.spinChunk.setValue(int(self.settings["chunk_size_kb"]))
+        self.spinBuffer.setValue(int(self.settings["write_buffer_kb"]))
+        self.checkPreallocate.setChecked(bool(self.settings["preallocate"]))
+        self.checkExtract.setChecked(bool(self.settings["extract"]))
+        self.editPatterns.setText(str(self.settings["extract_patterns"]))
+        self.checkKeepArchive.setChecked(bool(self.settings["keep_archive"]))
+        self.checkVerifyExisting.setChecked(bool(self.settings["verify_existing"]))
+        self.checkVerifyChecksum.setChecked(bool(self.settings["verify_checksum"]))
+        self.checkVerifyZipCrc.setChecked(bool(self.settings["verify_zip_crc"]))
+        self.checkStore.setChecked(bool(self.settings["store"]))
+        self.spinStoreBudget.setValue(int(self.settings["store_budget_gb"]))
+        self.checkSchedule.toggled.connect(self.update_enabled)
+        self.checkSegmented.toggled.connect(self.update_enabled)
+        self.checkVerifyExisting.toggled.connect(self.update_enabled)
+        self.checkExtract.toggled.connect(self.update_enabled)
+        self.checkStore.toggled.connect(self.update_enabled)
+        self.update_enabled()
+
+        self.btnSave.setIcon(self.style().standardIcon(QStyle.SP_DialogSaveButton))
+        self.btnCancel.setIcon(self.style().standardIcon(QStyle.SP_DialogCancelButton))
+
+        self.btnSave.clicked.connect(self.save)
+        self.btnCancel.clicked.connect(self.reject)
+
+    def update_enabled(self):
+        scheduled = self.checkSchedule.isChecked()
+        for widget in (self.timeStart, self.timeEnd, self.spinSchedulePercent, self.checkScheduleWeekdays):
+            widget.setEnabled(scheduled)
+        segmented = self.checkSegmented.isChecked()
+        self.spinSegments.setEnabled(segmented)
+        self.spinThreshold.setEnabled(segmented)
+        extract = self.checkExtract.isChecked()
+        self.editPatterns.setEnabled(extract)
+        self.checkKeepArchive.setEnabled(extract)
+        verify_existing = self.checkVerifyExisting.isChecked()
+        self.checkVerifyChecksum.setEnabled(verify_existing)
+        self.checkVerifyZipCrc.setEnabled(verify_existing)
+        self.spinStoreBudget.setEnabled(self.checkStore.isChecked())
+
+    def save(self):
+        floor = self.spinFloor.value()
+        ceiling = self.spinCeiling.value()
+        if floor > ceiling:
+            QMessageBox.warning(self, "Input Error", "The minimum number of parallel downloads cannot be larger than the maximum.")
+            return
+        # The bandwidth limit is changed in the main window while this
+        # dialog is open; merge the fields into the settings saved now.
+        settings = load_download_settings()
+        if self.checkSchedule.isChecked() and not settings["bandwidth_limit_mb"]:
+            QMessageBox.warning(
+                self,
+                "Input Error",
+                "The bandwidth schedule scales the bandwidth limit, but no limit is set. "
+                "Set a limit in the main window or switch the schedule off.",
+            )
+            return
+        settings["engine"] = self.comboEngine.currentData()
+        settings["order"] = self.comboOrder.currentData()
+        settings["concurrency_floor"] = floor
+        settings["concurrency_ceiling"] = ceiling
+        settings["order_parallel"] = self.spinOrderParallel.value()
+        schedule = settings["bandwidth_schedule"]
+        if self.checkSchedule.isChecked():
+            entry = {
+                "days": "weekdays" if self.checkScheduleWeekdays.isChecked() else "all",
+                "start": self.timeStart.time().toString("HH:mm"),
+                "end": self.timeEnd.time().toString("HH:mm"),
+                "percent": self.spinSchedulePercent.value(),
+            }
+            # Further entries can only be edited in the settings file
+            settings["bandwidth_schedule"] = [entry] + list(schedule[1:])
+        else:
+            settings["bandwidth_schedule"] = []
+        settings["segmented"] = self.checkSegmented.isChecked()
+        settings["segments"] = self.spinSegments.value()
+        settings["segment_threshold_mb"] = self.spinThreshold.value()
+        settings["chunk_size_kb"] = self.spinChunk.value()
+        settings["write_buffer_kb"] = self.spinBuffer.value()
+        settings["preallocate"] = self.checkPreallocate.isChecked()
+        settings["extract"] = self.checkExtract.isChecked()
+        settings["extract_patterns"] = self.editPatterns.text().strip()
+        settings["keep_archive"] = self.checkKeepArchive.isChecked()
+        settings["verify_existing"] = self.checkVerifyExisting.isChecked()
+        settings["verify_checksum"] = self.checkVerifyChecksum.isChecked()
+        settings["verify_zip_crc"] = self.checkVerifyZipCrc.isChecked()
+        settings["store"] = self.checkStore.isChecked()
+        settings["store_budget_gb"] = self.spinStoreBudget.value()
+        save_download_settings(settings)
+        self.settings = settings
+        self.accept()
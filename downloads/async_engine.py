@@ -0,0 +1,136 @@
+"""asyncio building blocks for running many transfers on one thread.
+
+The thread engine gives every running transfer its own thread and
+blocking requests connection. For batches of hundreds of small products
+the asyncio engine instead runs all transfers as coroutines on a single
+event loop with aiohttp. aiohttp is optional: when it is not installed,
+AVAILABLE is False and the thread engine is used.
+"""
+
+import asyncio
+import types
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    from .transfer import PartWriter
+except ImportError:
+    from downloads.transfer import PartWriter
+
+AVAILABLE = aiohttp is not None
+
+
+def create_session(connections, timeout=60):
+    """Return an aiohttp session with a pool of `connections` connections."""
+    connector = aiohttp.TCPConnector(limit=connections, limit_per_host=connections)
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout),
+        trust_env=True,
+    )
+
+
+def response_info(response):
+    """Adapt an aiohttp response to the status_code/headers used by transfer helpers."""
+    return types.SimpleNamespace(status_code=response.status, headers=response.headers)
+
+
+def is_timeout(error):
+    return isinstance(error, asyncio.TimeoutError) or (
+        aiohttp is not None and isinstance(error, aiohttp.ServerTimeoutError)
+    )
+
+
+async def sleep_unless(delay, cancelled, step=0.25):
+    """Sleep `delay` seconds in short steps. Returns True if cancelled meanwhile."""
+    loop = asyncio.get_running_loop()
+    end = loop.time() + delay
+    while not cancelled():
+        remaining = end - loop.time()
+        if remaining <= 0:
+            return False
+        await asyncio.sleep(min(step, remaining))
+    return True
+
+
+class SlotWakeup:
+    """Wakes the coroutines waiting for a transfer slot when one may be free.
+
+    Registered as a listener of an AdaptiveConcurrency, it is set from
+    whichever thread releases a slot, changes the limit or cancels.
+    """
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+        concurrency.add_listener(self.notify)
+
+    def notify(self):
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            # The loop is closed; nobody is waiting any more
+            pass
+
+    def close(self):
+        self.concurrency.remove_listener(self.notify)
+
+
+async def acquire_slot(concurrency, cancelled, wakeup):
+    """Wait for a slot of an AdaptiveConcurrency without blocking the loop.
+
+    `wakeup` is the SlotWakeup of `concurrency`; every waiter re-checks
+    when it is set.
+    """
+    with concurrency.queued():
+        while not cancelled():
+            # Cleared before checking, so a release after the check is not missed
+            wakeup.event.clear()
+            if concurrency.try_acquire():
+                return True
+            await wakeup.event.wait()
+    return False
+
+
+async def _inline(function, *args):
+    return function(*args)
+
+
+async def write_stream(response, path, start, total, state, cancelled,
+                       chunk_size=1024 * 1024, buffer_size=4 * 1024 * 1024,
+                       allocate=True, on_bytes=None, on_chunk=None, limiter=None,
+                       blocking=_inline):
+    """asyncio counterpart of transfer.write_stream for an aiohttp response.
+
+    Instead of a blocking throttle it takes the BandwidthLimiter and waits
+    on the event loop. Opening, writing and closing the part file, and the
+    `on_chunk` and `on_bytes` callbacks, go through `blocking(function,
+    *args)`, e.g. a coroutine that runs them in an executor, so disk I/O
+    does not stall the other transfers on the loop.
+    """
+    def consume(chunk):
+        writer.write(chunk)
+        if on_chunk:
+            on_chunk(chunk)
+        if on_bytes:
+            on_bytes(len(chunk))
+
+    writer = await blocking(PartWriter, path, start, total, state, buffer_size, allocate)
+    try:
+        async for chunk in response.content.iter_chunked(chunk_size):
+            if cancelled():
+                break
+            if not chunk:
+                continue
+            await blocking(consume, chunk)
+            if limiter is not None:
+                delay = limiter.reserve(len(chunk))
+                if delay > 0 and await sleep_unless(delay, cancelled):
+                    break
+    finally:
+        position = await blocking(writer.close)
+    return position
@@ -0,0 +1,102 @@
+"""Cancellation of a running batch.
+
+Setting a flag is not enough to stop a transfer: a thread blocked in a
+socket read only sees it when the next chunk arrives, which on a stalled
+connection is after the read timeout. CancelToken is a threading.Event
+that also knows the responses currently open, and shuts their sockets
+down when the batch is cancelled, so blocked reads fail right away.
+Everything waiting on the token (backoff sleeps, order polls, bandwidth
+throttling) wakes up at the same moment.
+"""
+
+import socket
+import threading
+from contextlib import contextmanager
+
+
+def _response_socket(response):
+    """The socket under a requests response, or None when it cannot be found."""
+    raw = getattr(response, "raw", None)
+    connection = getattr(raw, "_connection", None) or getattr(raw, "connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is not None:
+        return sock
+    # http.client response: its buffered reader wraps a SocketIO
+    fp = getattr(getattr(raw, "_fp", None), "fp", None)
+    return getattr(getattr(fp, "raw", None), "_sock", None)
+
+
+def abort_response(response):
+    """Interrupt a response, also from another thread than the one reading it.
+
+    Shutting the socket down makes a read blocked in another thread return
+    at once; closing it alone does not on every platform.
+    """
+    sock = _response_socket(response)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    try:
+        response.close()
+    except Exception:
+        pass
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._aborts = {}
+        self._callbacks = []
+
+    def is_set(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        """Sleep up to `timeout` seconds. Returns True when cancelled meanwhile."""
+        return self._event.wait(timeout)
+
+    def set(self):
+        """Cancel: wake all waiters, abort the tracked responses and run the callbacks."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            aborts = list(self._aborts.values())
+            self._aborts.clear()
+            callbacks = list(self._callbacks)
+        for abort in aborts:
+            abort()
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback):
+        """Call `callback` once when the token is cancelled."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    @contextmanager
+    def track(self, response, abort=None):
+        """Abort `response` if the batch is cancelled while the block runs.
+
+        `abort` replaces abort_response, e.g. for an aiohttp response that
+        must be closed on its event loop.
+        """
+        abort = abort or (lambda: abort_response(response))
+        key = id(response)
+        with self._lock:
+            cancelled = self._event.is_set()
+            if not cancelled:
+                self._aborts[key] = abort
+        if cancelled:
+            abort()
+        try:
+            yield response
+        finally:
+            with self._lock:
+                self._aborts.pop(key, None)
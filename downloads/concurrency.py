@@ -0,0 +1,168 @@
+"""Adaptive limit on the number of parallel product transfers.
+
+The controller starts at the floor and probes one more slot at a time for
+as long as aggregate throughput keeps improving. An increase that does not
+pay off is taken back. Server pushback (HTTP 429/5xx) and timeouts halve
+the limit (multiplicative decrease), never below the floor.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Length of a throughput measurement window in seconds
+SAMPLE_INTERVAL = 3.0
+# Relative throughput gain that justifies keeping an extra slot
+MIN_GAIN = 0.1
+# Windows to wait after a failed probe or a back-off before probing again
+HOLD_WINDOWS = 3
+
+
+class AdaptiveConcurrency:
+    def __init__(self, floor=1, ceiling=8, on_change=None):
+        self.floor = max(1, int(floor))
+        self.ceiling = max(self.floor, int(ceiling))
+        self.limit = self.floor
+        self.active = 0
+        self.waiting = 0
+        self.on_change = on_change
+
+        self._cond = threading.Condition()
+        # Called, under the lock, whenever a slot may have become free
+        self._listeners = []
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+        self._baseline = None  # throughput before the last increase
+        self._probing = False
+        self._hold = 0
+        self._last_backoff = 0.0
+
+    def acquire(self, cancelled=lambda: False):
+        """Block until a transfer slot is free. Returns False if cancelled."""
+        with self._cond:
+            self.waiting += 1
+            try:
+                while self.active >= self.limit:
+                    if cancelled():
+                        return False
+                    self._cond.wait(0.5)
+                if cancelled():
+                    return False
+                self.active += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def try_acquire(self):
+        """Take a free transfer slot without blocking. Returns False when none is free."""
+        with self._cond:
+            if self.active >= self.limit:
+                return False
+            self.active += 1
+            return True
+
+    @contextmanager
+    def queued(self):
+        """Count a caller polling try_acquire() as waiting for a slot."""
+        with self._cond:
+            self.waiting += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.waiting -= 1
+
+    def release(self):
+        with self._cond:
+            self.active = max(0, self.active - 1)
+            self._notify()
+
+    def wake(self):
+        """Let callers waiting for a slot re-check their cancel condition now."""
+        with self._cond:
+            self._notify()
+
+    def add_listener(self, callback):
+        """Call `callback()` whenever a slot may have become free.
+
+        It is called with the lock held, from whichever thread released
+        the slot, and must not block (e.g. loop.call_soon_threadsafe).
+        """
+        with self._cond:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._cond:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _notify(self):
+        self._cond.notify_all()
+        for callback in self._listeners:
+            callback()
+
+    @contextmanager
+    def slot(self, cancelled=lambda: False):
+        acquired = self.acquire(cancelled)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.release()
+
+    def record_bytes(self, count):
+        """Account transferred bytes and re-evaluate the limit once per window."""
+        changed = None
+        with self._cond:
+            self._window_bytes += count
+            now = time.monotonic()
+            elapsed = now - self._window_start
+            if elapsed >= SAMPLE_INTERVAL:
+                changed = self._evaluate(self._window_bytes / elapsed)
+                self._window_start = now
+                self._window_bytes = 0
+        if changed is not None and self.on_change:
+            self.on_change(changed)
+
+    def record_failure(self):
+        """Back off after a 429/5xx response or a timeout."""
+        with self._cond:
+            now = time.monotonic()
+            # Several transfers usually fail together; back off once per window
+            if now - self._last_backoff < SAMPLE_INTERVAL:
+                return
+            self._last_backoff = now
+            new_limit = max(self.floor, self.limit // 2)
+            self._baseline = None
+            self._probing = False
+            self._hold = HOLD_WINDOWS
+            self._window_start = now
+            self._window_bytes = 0
+            changed = self._set_limit(new_limit)
+        if changed is not None and self.on_change:
+            self.on_change(changed)
+
+    def _evaluate(self, throughput):
+        if self._probing:
+            self._probing = False
+            if throughput < self._baseline * (1 + MIN_GAIN):
+                # The extra slot did not help: take it back and rest a while
+                self._hold = HOLD_WINDOWS
+                return self._set_limit(self.limit - 1)
+        if self._hold:
+            self._hold -= 1
+            return None
+        # Only probe when the current slots are all in use and work is queued
+        if self.active >= self.limit and self.waiting and self.limit < self.ceiling:
+            self._baseline = throughput
+            self._probing = True
+            return self._set_limit(self.limit + 1)
+        return None
+
+    def _set_limit(self, limit):
+        limit = max(self.floor, min(self.ceiling, limit))
+        if limit == self.limit:
+            return None
+        self.limit = limit
+        self._notify()
+        return limit
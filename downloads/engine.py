@@ -0,0 +1,1044 @@
+"""Download engine shared by the plugin and the command line.
+
+DownloadEngine runs a batch of products: verification of files already
+on disk, the product store, quota, the order stage and the transfers with
+retries, adaptive concurrency and the bandwidth limit. It contains no Qt
+code. It reports through a signals object with progress, status,
+concurrency, transfer, finished and error members that each have an
+emit() method: Qt signals in the plugin, EngineSignals elsewhere.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, CancelledError, wait
+
+import requests
+
+try:
+    from ..http_session import configure_pool, get_session
+    from . import async_engine, cancel, journal, orders, ordering, quota, ratelimit, retry, store, transfer, verify, zipstream
+    from .concurrency import AdaptiveConcurrency
+    from .progress import ByteProgress
+    from .settings import load_download_settings
+except ImportError:
+    from http_session import configure_pool, get_session
+    from downloads import async_engine, cancel, journal, orders, ordering, quota, ratelimit, retry, store, transfer, verify, zipstream
+    from downloads.concurrency import AdaptiveConcurrency
+    from downloads.progress import ByteProgress
+    from downloads.settings import load_download_settings
+
+_log_handler = None
+
+
+def set_log_handler(handler):
+    """Send the engine's log messages to `handler(msg, tag, level)`, e.g. the QGIS log."""
+    global _log_handler
+    _log_handler = handler
+
+
+def log_message(msg, tag="Copernicus Connect", level="INFO"):
+    if _log_handler is not None:
+        _log_handler(msg, tag, level)
+    else:
+        print(f"[{level}] {tag}: {msg}")
+
+
+class Signal:
+    """Minimal stand-in for a Qt signal: callbacks connected to it run on emit()."""
+
+    def __init__(self):
+        self._callbacks = []
+
+    def connect(self, callback):
+        self._callbacks.append(callback)
+
+    def emit(self, *args):
+        for callback in list(self._callbacks):
+            callback(*args)
+
+
+class EngineSignals:
+    def __init__(self):
+        self.progress = Signal()
+        self.status = Signal()
+        self.concurrency = Signal()
+        self.transfer = Signal()
+        self.finished = Signal()
+        self.error = Signal()
+
+
+# Bytes between two progress updates of a product in the download journal
+JOURNAL_BYTES_INTERVAL = 32 * 1024 ** 2
+# Responses that will not change by trying again
+PERMANENT_STATUS_CODES = (400, 403, 404, 410)
+# Ready orders that may wait per transfer slot before ordering pauses
+ORDER_LOOKAHEAD = 2
+
+
+class DownloadEngine:
+    # Marks the log messages of a transfer with the engine that runs it
+    LOG_PREFIX = "[THREAD]"
+
+    def __init__(self, matches, client, query, selected_ids, out_dir, batch_id=None, signals=None, settings=None):
+        self.matches = matches
+        self.client = client
+        self.query = query
+        self.selected_ids = set(selected_ids)
+        self.out_dir = out_dir
+        self.cancelled = False
+        self.started_downloads = 0
+        self.completed_downloads = 0
+        self.signals = signals or EngineSignals()
+        self._counter_lock = threading.Lock()
+        self.settings = settings or load_download_settings()
+        self.concurrency = AdaptiveConcurrency(
+            self.settings["concurrency_floor"],
+            self.settings["concurrency_ceiling"],
+            on_change=self.signals.concurrency.emit,
+        )
+        self.quota = quota.QuotaScheduler()
+        # Products holding a quota token whose transfer has not started yet
+        self.unstarted = set()
+        self.batch_id = batch_id
+        self.journal = None
+        self.progress = ByteProgress(emit=self.emit_progress)
+        self.pending_downloads = 0
+        self.skipped_downloads = 0
+        self.stored_downloads = 0
+        self.store = None
+        # Products left unfinished by a cancel, with the bytes kept for a resume
+        self.partial_downloads = 0
+        self.partial_bytes = 0
+        self.retry_policy = retry.RetryPolicy(
+            attempts=self.settings["retry_attempts"],
+            base=self.settings["retry_base_delay"],
+            cap=self.settings["retry_max_delay"],
+            deadline=self.settings["retry_deadline_minutes"] * 60,
+        )
+        # Products whose server ignored Range requests
+        self.single_stream = set()
+        # Heap of (not before, order, (match, url, retry state)) of failed
+        # transfers waiting for their backoff
+        self.retrying = []
+        self._retry_lock = threading.Lock()
+        self._retry_order = itertools.count()
+        # Wakes every wait of the batch and aborts open responses on cancel
+        self.cancel_event = cancel.CancelToken()
+        self.cancel_event.on_cancel(self.concurrency.wake)
+        self.extract_patterns = zipstream.parse_patterns(self.settings["extract_patterns"])
+        # Streaming extraction of the latest attempt per product
+        self.unzippers = {}
+        self.limiter = ratelimit.get_limiter()
+        self.resolver = orders.OrderResolver(
+            client,
+            poll_interval=self.settings["order_poll_interval"],
+            poll_max=self.settings["order_poll_max"],
+            timeout=self.settings["order_timeout_minutes"] * 60,
+        )
+        
+    def cancel(self):
+        self.cancelled = True
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            # Enough threads for the ceiling; the controller decides how many
+            # of them may transfer at the same time.
+            max_workers = self.concurrency.ceiling
+            connections = max_workers
+            if self.settings["segmented"]:
+                connections *= self.settings["segments"]
+            configure_pool(connections + self.settings["order_parallel"])
+            self.signals.concurrency.emit(self.concurrency.limit)
+
+            selected = self.prepare_batch()
+            # Products whose order is ready, waiting for a transfer slot. The
+            # bound keeps orders from running too far ahead of the transfers.
+            ready = queue.Queue(maxsize=max_workers * ORDER_LOOKAHEAD)
+            order_pool = ThreadPoolExecutor(max_workers=self.settings["order_parallel"])
+            transfer_pool = ThreadPoolExecutor(max_workers=max_workers)
+            transfers = [
+                transfer_pool.submit(self.transfer_loop, ready)
+                for _ in range(min(max_workers, len(selected)))
+            ]
+            order_futures = [order_pool.submit(self.order_product, match, ready) for match in selected]
+            try:
+                self.wait_for(order_futures, cancel_pending=True)
+                for _ in transfers:
+                    if not self.put_ready(ready, None):
+                        break
+                self.wait_for(transfers)
+            finally:
+                if self.cancelled:
+                    for future in order_futures:
+                        future.cancel()
+                for pool in (order_pool, transfer_pool):
+                    try:
+                        pool.shutdown(wait=False, cancel_futures=True)
+                    except TypeError:
+                        pool.shutdown(wait=False)
+                self.drain_ready(ready)
+                self.drain_retrying()
+                if self.cancelled:
+                    self.release_unstarted_quota()
+
+            self.finish_batch()
+
+        except Exception as e:
+            tb = traceback.format_exc()
+            self.signals.error.emit(f"Unexpected error: {e}\n\n{tb}")
+        finally:
+            self.close_journal()
+
+    def wait_for(self, futures, cancel_pending=False):
+        """Wait for `futures` and report their errors.
+
+        With `cancel_pending`, futures that have not started yet are
+        cancelled once the batch is, and only the running ones are awaited.
+        """
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            if cancel_pending and self.cancelled:
+                pending = {future for future in pending if not future.cancel()}
+            for future in done:
+                try:
+                    future.result()
+                except CancelledError:
+                    pass
+                except Exception as e:
+                    tb = traceback.format_exc()
+                    self.signals.error.emit(f"Error during download: {e}\n\n{tb}")
+
+    def put_ready(self, ready, item):
+        """Queue `item` for the transfer stage. Returns False if cancelled while waiting."""
+        while not self.cancelled:
+            try:
+                ready.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def drain_ready(self, ready):
+        """Record products that were ordered but never transferred as cancelled."""
+        while True:
+            try:
+                item = ready.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                self.finish_product(item[0], False)
+
+    def release_unstarted_quota(self):
+        """Give back the quota tokens of products that were ordered but never transferred."""
+        with self._counter_lock:
+            count = len(self.unstarted)
+            self.unstarted.clear()
+        if count:
+            self.quota.release(count)
+            log_message(f"Released the download quota of {count} products that did not start", "Copernicus Connect", "INFO")
+
+    def prepare_batch(self):
+        """Pick the selected products, record them and return their matches.
+
+        The journal keeps the search result order; the returned matches are
+        in the order the transfers should start.
+        """
+        selected = [match for match in self.matches if match.results[0]['id'] in self.selected_ids]
+        self.pending_downloads = len(selected)
+        for match in selected:
+            self.progress.set_expected(match.results[0]['id'], match.results[0].get("properties", {}).get("size"))
+        self.open_journal(selected)
+        self.open_store()
+        selected = ordering.order_products(
+            selected,
+            self.settings["order"],
+            lambda match: ordering.feature_size(match.results[0]),
+        )
+
+        available = self.quota.available()
+        if len(selected) > available:
+            eta = self.quota.eta(len(selected))
+            log_message(
+                f"Download quota allows {available} of {len(selected)} products now; "
+                f"the last one can start at {eta:%H:%M}",
+                "Copernicus Connect",
+                "INFO",
+            )
+        return selected
+
+    def open_store(self):
+        """Open the shared product store when it is enabled in the settings."""
+        if not self.settings["store"]:
+            return
+        try:
+            self.store = store.ProductStore(
+                self.settings["store_path"] or None,
+                budget=self.settings["store_budget_gb"] * 1024 ** 3 or None,
+            )
+        except Exception as e:
+            self.store = None
+            log_message(f"Product store unavailable: {e}", "Copernicus Connect", "WARNING")
+
+    def finish_batch(self):
+        if self.store is not None:
+            self.store.close()
+        self.close_journal()
+        if self.stored_downloads:
+            log_message(f"{self.stored_downloads} products were taken from the product store", "Copernicus Connect", "INFO")
+        if self.skipped_downloads:
+            log_message(f"{self.skipped_downloads} products were already complete on disk and were skipped", "Copernicus Connect", "INFO")
+        if self.cancelled:
+            self.signals.status.emit("Download cancelled.")
+        elif self.skipped_downloads or self.stored_downloads:
+            reused = []
+            if self.skipped_downloads:
+                reused.append(f"{self.skipped_downloads} already on disk")
+            if self.stored_downloads:
+                reused.append(f"{self.stored_downloads} from the product store")
+            self.signals.status.emit(f"Download finished ({', '.join(reused)}).")
+        else:
+            self.signals.status.emit("Download finished.")
+
+        self.signals.finished.emit()
+
+    def open_journal(self, selected):
+        """Record the batch in the on-disk journal, unless it is being resumed."""
+        try:
+            self.journal = journal.DownloadJournal(self.out_dir)
+            if self.batch_id is None:
+                dataset_id = (self.query or {}).get("dataset_id") or getattr(self.matches, "dataset", None)
+                self.batch_id = self.journal.start_batch(dataset_id, self.query, [m.results[0] for m in selected])
+        except Exception as e:
+            self.close_journal()
+            log_message(f"Download journal unavailable: {e}", "Copernicus Connect", "WARNING")
+
+    def close_journal(self):
+        """Close the journal connection; transfers still stopping no longer update it."""
+        current, self.journal = self.journal, None
+        if current is not None:
+            current.close()
+
+    def journal_update(self, file_id, status=None, url=None, bytes_done=None):
+        current = self.journal
+        if current is None:
+            return
+        try:
+            if status is not None:
+                current.set_status(self.batch_id, file_id, status, url)
+            if bytes_done is not None:
+                current.set_bytes_done(self.batch_id, file_id, bytes_done)
+        except Exception as e:
+            log_message(f"Could not update download journal: {e}", "Copernicus Connect", "WARNING")
+
+    def emit_progress(self, snapshot):
+        self.signals.progress.emit(snapshot["percent"])
+        self.signals.transfer.emit(snapshot)
+
+    def record_bytes(self, file_id, count):
+        """Account written bytes for progress, the concurrency controller and the journal."""
+        self.concurrency.record_bytes(count)
+        before = self.progress.done_for(file_id)
+        self.progress.add(file_id, count)
+        after = before + count
+        if after // JOURNAL_BYTES_INTERVAL != before // JOURNAL_BYTES_INTERVAL:
+            self.journal_update(file_id, bytes_done=after)
+
+    def throttle(self, count):
+        """Hold the calling transfer back while the bandwidth limit is exceeded."""
+        self.limiter.consume(count, self.cancel_event)
+
+    def quota_wait(self, release):
+        with self._counter_lock:
+            pending = self.pending_downloads
+        eta = self.quota.eta(pending)
+        snapshot = self.progress.snapshot()
+        finish = self.quota.finish_eta(
+            pending,
+            snapshot["bytes_total"] - snapshot["bytes_done"],
+            snapshot["current_bps"] or snapshot["average_bps"],
+        )
+        finish = f", all done about {finish:%H:%M}" if finish is not None else ""
+        self.signals.status.emit(
+            f"Waiting for download quota: next download at {release:%H:%M:%S}, "
+            f"{pending} left, last one starts about {eta:%H:%M}{finish}"
+        )
+
+    def destination_path(self, match):
+        file_id = match.results[0]['id']
+        location = match.results[0].get("properties", {}).get("location", "")
+        extension = os.path.splitext(location)[1] or ".zip"
+        return os.path.join(str(self.out_dir), f"{file_id}{extension}")
+
+    def skip_if_complete(self, match):
+        """Check a file already on disk. Returns True when it is complete and valid."""
+        if not self.settings["verify_existing"]:
+            return False
+        feature = match.results[0]
+        file_id = feature['id']
+        destination_path = self.destination_path(match)
+        size = feature.get("properties", {}).get("size")
+        expected_size = size if isinstance(size, int) else None
+        checksum = verify.expected_checksum(feature) if self.settings["verify_checksum"] else None
+        state = verify.verify_existing(destination_path, expected_size, checksum, test_crc=self.settings["verify_zip_crc"])
+
+        if state == verify.INVALID:
+            log_message(f"{self.LOG_PREFIX} Existing file for {file_id} is damaged, downloading it again", "Copernicus Connect", "WARNING")
+            try:
+                os.remove(destination_path)
+            except OSError:
+                pass
+            return False
+        if state == verify.MISSING and self.settings["extract"]:
+            # The archive may have been removed after it was extracted
+            on_disk = zipstream.extracted_size(self.extract_dir(match))
+            if on_disk is None:
+                return False
+        elif state != verify.COMPLETE:
+            return False
+        else:
+            on_disk = os.path.getsize(destination_path)
+            if not self.extract_product(match, destination_path):
+                return False
+
+        self.progress.set_expected(file_id, on_disk)
+        self.progress.set_done(file_id, on_disk)
+        self.progress.finish(file_id)
+        self.journal_update(file_id, journal.DONE, bytes_done=on_disk)
+        with self._counter_lock:
+            self.pending_downloads -= 1
+            self.skipped_downloads += 1
+        log_message(f"{self.LOG_PREFIX} {file_id} is already complete on disk, skipped", "Copernicus Connect", "SUCCESS")
+        return True
+
+    def take_from_store(self, match):
+        """Put a product found in the product store into the download folder.
+
+        Returns True when it was there; such products need neither quota
+        nor an order.
+        """
+        if self.store is None:
+            return False
+        feature = match.results[0]
+        file_id = feature['id']
+        key = store.product_key(feature)
+        if key is None:
+            return False
+        destination_path = self.destination_path(match)
+        try:
+            method = self.store.materialize(key, destination_path)
+        except OSError as e:
+            log_message(f"{self.LOG_PREFIX} Could not take {file_id} from the product store: {e}", "Copernicus Connect", "WARNING")
+            return False
+        if method is None:
+            return False
+        # An earlier, interrupted download of it is no longer needed
+        transfer.discard_part(destination_path)
+        size = os.path.getsize(destination_path)
+        if not self.extract_product(match, destination_path):
+            return False
+
+        self.progress.set_expected(file_id, size)
+        self.progress.set_done(file_id, size)
+        self.progress.finish(file_id)
+        self.journal_update(file_id, journal.DONE, bytes_done=size)
+        with self._counter_lock:
+            self.pending_downloads -= 1
+            self.stored_downloads += 1
+        log_message(f"{self.LOG_PREFIX} {file_id} taken from the product store ({method})", "Copernicus Connect", "SUCCESS")
+        return True
+
+    def add_to_store(self, match, destination_path):
+        if self.store is None:
+            return
+        feature = match.results[0]
+        key = store.product_key(feature)
+        if key is None:
+            return
+        try:
+            self.store.add(key, destination_path, feature['id'])
+        except OSError as e:
+            log_message(f"{self.LOG_PREFIX} Could not keep {feature['id']} in the product store: {e}", "Copernicus Connect", "WARNING")
+
+    def extract_dir(self, match):
+        return os.path.join(str(self.out_dir), match.results[0]['id'])
+
+    def extract_product(self, match, destination_path, unzipper=None):
+        """Unpack a downloaded ZIP product when extraction is enabled.
+
+        Members already unpacked while downloading are kept; otherwise the
+        archive is extracted from disk. Returns False when that fails.
+        """
+        if not self.settings["extract"] or not verify.is_zip_path(destination_path):
+            return True
+        file_id = match.results[0]['id']
+        dest_dir = self.extract_dir(match)
+        size = os.path.getsize(destination_path)
+        if zipstream.extracted_size(dest_dir) != size:
+            if unzipper is not None and unzipper.close():
+                log_message(f"{self.LOG_PREFIX} Extracted {len(unzipper.extracted)} files of {file_id} while downloading", "Copernicus Connect", "INFO")
+            else:
+                if unzipper is not None:
+                    log_message(f"{self.LOG_PREFIX} Could not extract {file_id} while downloading ({unzipper.failed}), extracting from disk", "Copernicus Connect", "INFO")
+                try:
+                    extracted = zipstream.extract_archive(destination_path, dest_dir, self.extract_patterns)
+                except Exception as e:
+                    log_message(f"{self.LOG_PREFIX} Extracting {file_id} failed: {e}", "Copernicus Connect", "ERROR")
+                    return False
+                log_message(f"{self.LOG_PREFIX} Extracted {len(extracted)} files of {file_id}", "Copernicus Connect", "INFO")
+            zipstream.mark_extracted(dest_dir, size)
+        if not self.settings["keep_archive"]:
+            os.remove(destination_path)
+        return True
+
+    def existing_matches(self, destination_path, total):
+        """True when a file of unknown size on disk has the size the server announces."""
+        if not self.settings["verify_existing"] or total is None:
+            return False
+        try:
+            if os.path.getsize(destination_path) != total:
+                return False
+        except OSError:
+            return False
+        if verify.is_zip_path(destination_path):
+            return verify.zip_is_valid(destination_path, self.settings["verify_zip_crc"])
+        return True
+
+    def order_product(self, match, ready):
+        """First pipeline stage: check the disk, take quota, order the product.
+
+        The ready URL is handed to the transfer stage, so preparing one
+        order never holds a transfer slot.
+        """
+        file_id = match.results[0]['id']
+        if self.cancelled:
+            return
+        # Files that are already complete neither need an order nor quota
+        if self.skip_if_complete(match) or self.take_from_store(match):
+            return
+        if not self.quota.acquire(lambda: self.cancelled, on_wait=self.quota_wait, sleep=self.cancel_event.wait):
+            return
+        with self._counter_lock:
+            self.pending_downloads -= 1
+            self.started_downloads += 1
+            self.unstarted.add(file_id)
+
+        url = self.resolve_url(match)
+        if url is None:
+            self.finish_product(match, False)
+            return
+        self.journal_update(file_id, journal.DOWNLOADING, url)
+        if not self.put_ready(ready, (match, url)):
+            self.finish_product(match, False)
+
+    def resolve_url(self, match):
+        """Order a product, retrying failed orders. Returns None when it cannot be ordered."""
+        file_id = match.results[0]['id']
+        retries = self.retry_policy.begin()
+        while not self.cancelled:
+            try:
+                return self.resolver.resolve(match.dataset, match.results[0], self.cancel_event)
+            except orders.OrderCancelled:
+                return None
+            except Exception as e:
+                error = e
+            delay = retries.next_delay(getattr(error, "retry_after", None))
+            if delay is None:
+                log_message(f"{self.LOG_PREFIX} Order of {file_id} failed: {error}. All attempts failed", "Copernicus Connect", "CRITICAL")
+                return None
+            log_message(f"{self.LOG_PREFIX} Order of {file_id} failed: {error}. Retrying in {delay:.1f} s", "Copernicus Connect", "WARNING")
+            if self.cancel_event.wait(delay):
+                return None
+        return None
+
+    def transfer_loop(self, ready):
+        """Second pipeline stage: transfer products whose order is ready.
+
+        Products waiting to retry are taken up again once their backoff is
+        over; until then the thread transfers other products. After the end
+        of the ready queue the thread stays until no product waits to retry.
+        """
+        ended = False
+        while not self.cancelled:
+            item, wait = self.next_retry()
+            if item is None:
+                if ended:
+                    if wait is None:
+                        return
+                    self.cancel_event.wait(min(wait, 0.5))
+                    continue
+                try:
+                    item = ready.get(timeout=min(wait, 0.5) if wait is not None else 0.5)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    ended = True
+                    continue
+                item = item + (None,)
+            match, url, retries = item
+            try:
+                self.transfer_product(match, url, retries)
+            except Exception as e:
+                tb = traceback.format_exc()
+                self.signals.error.emit(f"Error during download: {e}\n\n{tb}")
+            self.progress.flush()
+
+    def next_retry(self):
+        """Return (item, None) for a product whose backoff is over, else (None, seconds to the next one or None)."""
+        with self._retry_lock:
+            if not self.retrying:
+                return None, None
+            wait = self.retrying[0][0] - time.monotonic()
+            if wait > 0:
+                return None, wait
+            return heapq.heappop(self.retrying)[2], None
+
+    def transfer_product(self, match, url, retries=None):
+        """Make one attempt at transferring a product.
+
+        A failed attempt worth retrying is put among the retrying products
+        with its backoff, outside of the transfer slot and the thread, so
+        other products keep the connection busy in the meantime.
+        """
+        file_id = match.results[0]['id']
+        if retries is None:
+            self.signals.status.emit(f"Downloading {file_id}...")
+            retries = self.retry_policy.begin()
+        ok = False
+        error = None
+        with self.concurrency.slot(lambda: self.cancelled) as acquired:
+            if acquired:
+                with self._counter_lock:
+                    self.unstarted.discard(file_id)
+                try:
+                    ok = self.download_file(match, url, retries.attempt)
+                except Exception as e:
+                    error = e
+        # An attempt aborted by a cancel fails with a connection error
+        if error is not None and not self.cancelled:
+            if isinstance(error, requests.exceptions.Timeout):
+                self.concurrency.record_failure()
+            delay = retries.next_delay(getattr(error, "retry_after", None))
+            if delay is None:
+                log_message(f"{self.LOG_PREFIX} Attempt {retries.attempt} ERROR for {file_id}: {error}. All attempts failed", "Copernicus Connect", "CRITICAL")
+            else:
+                log_message(f"{self.LOG_PREFIX} Attempt {retries.attempt - 1} ERROR for {file_id}: {error}. Retrying in {delay:.1f} s", "Copernicus Connect", "WARNING")
+                with self._retry_lock:
+                    heapq.heappush(self.retrying, (time.monotonic() + delay, next(self._retry_order), (match, url, retries)))
+                return
+
+        self.finish_product(match, ok)
+
+    def drain_retrying(self):
+        """Record products still waiting to retry as cancelled."""
+        with self._retry_lock:
+            items = [entry[2] for entry in self.retrying]
+            self.retrying = []
+        for match, _, _ in items:
+            self.finish_product(match, False)
+
+    def finish_product(self, match, ok):
+        """Extract a downloaded product if enabled and record its outcome."""
+        file_id = match.results[0]['id']
+        unzipper = self.unzippers.pop(file_id, None)
+        if ok:
+            # Before extraction, which may remove the archive
+            self.add_to_store(match, self.destination_path(match))
+            ok = self.extract_product(match, self.destination_path(match), unzipper)
+        elif unzipper is not None:
+            unzipper.close()
+
+        if self.cancelled and not ok:
+            done = self.progress.done_for(file_id)
+            self.journal_update(file_id, journal.CANCELLED, bytes_done=done)
+            if done:
+                with self._counter_lock:
+                    self.partial_downloads += 1
+                    self.partial_bytes += done
+        elif ok:
+            self.progress.finish(file_id)
+            self.journal_update(file_id, journal.DONE, bytes_done=self.progress.done_for(file_id))
+            with self._counter_lock:
+                self.completed_downloads += 1
+        else:
+            self.journal_update(file_id, journal.FAILED)
+
+    def download_file(self, match, url, attempt):
+        """Make one attempt at downloading a product.
+
+        Returns True when the file is complete on disk and False when it was
+        cancelled or cannot be downloaded. Raises TransientError, or the
+        exception of the request, when the attempt is worth retrying.
+        """
+        file_id = match.results[0]['id']
+        destination_path = self.destination_path(match)
+        headers = {"Authorization": f"Bearer {self.client.token}"}
+
+        size = match.results[0].get("properties", {}).get("size")
+        if (
+            self.settings["segmented"]
+            and file_id not in self.single_stream
+            and isinstance(size, int)
+            and size >= self.settings["segment_threshold_mb"] * 1024 ** 2
+        ):
+            try:
+                return self.download_segmented(url, headers, destination_path, file_id, attempt)
+            except transfer.RangeNotSupported as e:
+                log_message(f"{self.LOG_PREFIX} Server does not support ranges for {file_id} ({e}), using one connection", "Copernicus Connect", "WARNING")
+                self.single_stream.add(file_id)
+
+        if self.cancelled:
+            self.signals.status.emit("Download cancelled.")
+            return False
+
+        # Continue from the bytes already on disk when we know which
+        # representation they belong to; otherwise start from zero.
+        request_headers, offset = transfer.prepare_resume(destination_path, headers)
+        response = get_session().get(url, headers=request_headers, stream=True, timeout=60)
+        with response, self.cancel_event.track(response):
+            outcome = self.check_response(file_id, destination_path, response, offset)
+            if outcome is not None:
+                return outcome
+            prepared = self.prepare_body(match, destination_path, response, offset)
+            if prepared is None:
+                return True
+            start, total, state, unzipper = prepared
+            size = transfer.write_stream(
+                response,
+                destination_path,
+                start,
+                total,
+                state,
+                lambda: self.cancelled,
+                chunk_size=self.settings["chunk_size_kb"] * 1024,
+                buffer_size=self.settings["write_buffer_kb"] * 1024,
+                allocate=self.settings["preallocate"],
+                on_bytes=lambda count: self.record_bytes(file_id, count),
+                on_chunk=unzipper.feed if unzipper is not None else None,
+                throttle=self.throttle,
+            )
+        return self.complete_body(file_id, destination_path, size, total, attempt)
+
+    def check_response(self, file_id, destination_path, response, offset):
+        """Act on the status of a download response.
+
+        Returns True or False when the attempt is over (the file was already
+        complete, or the product cannot be downloaded) and None when the
+        body should be written. Raises TransientError for retryable statuses.
+        """
+        if response.status_code == 416 and offset:
+            content_range = transfer.parse_content_range(response.headers.get("Content-Range"))
+            if content_range and content_range[2] == offset:
+                transfer.finalize_part(destination_path)
+                log_message(f"{self.LOG_PREFIX} {file_id} was already complete on disk", "Copernicus Connect", "SUCCESS")
+                return True
+            transfer.discard_part(destination_path)
+            raise retry.TransientError("range not satisfiable, restarting from zero")
+
+        if response.status_code not in (200, 206):
+            retry_after = retry.parse_retry_after(response.headers.get("Retry-After"))
+            if response.status_code == 429 or response.status_code >= 500:
+                self.concurrency.record_failure()
+            elif response.status_code in PERMANENT_STATUS_CODES:
+                log_message(f"{self.LOG_PREFIX} Download of {file_id} failed with status code: {response.status_code}", "Copernicus Connect", "CRITICAL")
+                return False
+            raise retry.TransientError(f"status code {response.status_code}", retry_after)
+        return None
+
+    def prepare_body(self, match, destination_path, response, offset):
+        """Get ready to write a 200/206 body.
+
+        Returns (start, total, resume state, unzipper or None), or None when
+        the file already on disk turns out to be the complete product.
+        """
+        file_id = match.results[0]['id']
+        self.discard_unzipper(file_id)
+        start = transfer.response_start(response, offset)
+        if offset and not start:
+            log_message(f"{self.LOG_PREFIX} Server did not resume {file_id}, restarting from zero", "Copernicus Connect", "WARNING")
+        elif start:
+            log_message(f"{self.LOG_PREFIX} Resuming {file_id} at byte {start}", "Copernicus Connect", "INFO")
+
+        total = transfer.expected_total(response, start)
+        if not start and self.existing_matches(destination_path, total):
+            log_message(f"{self.LOG_PREFIX} {file_id} is already complete on disk", "Copernicus Connect", "SUCCESS")
+            self.progress.set_expected(file_id, total)
+            return None
+        state = transfer.response_validators(response)
+        state["total"] = total
+        state["committed"] = start
+        transfer.save_resume_state(destination_path, state)
+
+        if total is not None:
+            self.progress.set_expected(file_id, total)
+        self.progress.set_done(file_id, start)
+        # Bytes before a resumed offset never pass through here, so such
+        # archives are extracted from disk afterwards.
+        unzipper = None
+        if self.settings["extract"] and verify.is_zip_path(destination_path) and not start:
+            unzipper = zipstream.StreamingUnzipper(self.extract_dir(match), self.extract_patterns)
+        self.unzippers[file_id] = unzipper
+        return start, total, state, unzipper
+
+    def discard_unzipper(self, file_id):
+        """Close the unzipper of an earlier attempt; the member it was writing is removed."""
+        unzipper = self.unzippers.pop(file_id, None)
+        if unzipper is not None:
+            unzipper.close()
+
+    def complete_body(self, file_id, destination_path, size, total, attempt):
+        """Move a fully written part file into place. Returns False when cancelled."""
+        if self.cancelled:
+            self.signals.status.emit("Download cancelled during file write.")
+            return False
+        if total is not None and size != total:
+            # Keep the part file and its committed offset for the next attempt
+            raise retry.TransientError(f"transfer ended at {size} of {total} bytes")
+
+        transfer.finalize_part(destination_path)
+        log_message(f"{self.LOG_PREFIX} Download OK for {file_id} (attempt {attempt})", "Copernicus Connect", "SUCCESS")
+        return True
+
+    def download_segmented(self, url, headers, destination_path, file_id, attempt):
+        """Make one parallel Range attempt. Returns True when the file is complete.
+
+        Raises RangeNotSupported when the server does not support ranges, so
+        the caller continues with the single stream download.
+        """
+        segments = self.settings["segments"]
+        if transfer.download_segmented(get_session().get, url, headers, destination_path, segments, lambda: self.cancelled, chunk_size=self.settings["chunk_size_kb"] * 1024, on_bytes=lambda count: self.record_bytes(file_id, count), throttle=self.throttle, track=self.cancel_event.track, on_resume=lambda count: self.progress.set_done(file_id, count)):
+            log_message(f"{self.LOG_PREFIX} Segmented download OK for {file_id} ({segments} connections, attempt {attempt})", "Copernicus Connect", "SUCCESS")
+            return True
+        if self.cancelled:
+            return False
+        raise retry.TransientError("segmented download incomplete")
+
+
+class AsyncDownloadEngine(DownloadEngine):
+    """Runs the transfers of a batch as coroutines on one asyncio event loop.
+
+    Meant for batches of many small products, where a thread and a blocking
+    connection per transfer cost more than they bring. Signals, journal,
+    quota, ordering pipeline, verification and extraction are the same as
+    in DownloadEngine. Polling orders, the journal and all file I/O
+    (checking, writing and extracting) still block, so they run on helper
+    threads and never on the event loop. Segmented downloads are not
+    supported here.
+    """
+
+    LOG_PREFIX = "[ASYNC]"
+
+    def run(self):
+        try:
+            asyncio.run(self.run_batch())
+            self.finish_batch()
+        except Exception as e:
+            tb = traceback.format_exc()
+            self.signals.error.emit(f"Unexpected error: {e}\n\n{tb}")
+        finally:
+            self.close_journal()
+
+    async def run_batch(self):
+        self.signals.concurrency.emit(self.concurrency.limit)
+        selected = self.prepare_batch()
+        pending = asyncio.Queue()
+        for match in selected:
+            pending.put_nowait(match)
+        ready = asyncio.Queue(maxsize=self.concurrency.ceiling * ORDER_LOOKAHEAD)
+        order_parallel = self.settings["order_parallel"]
+        # Orders are polled with blocking hda calls, one thread each. File
+        # I/O has its own threads, one per transfer and per order worker
+        # checking the disk, so long order polls never hold up writes.
+        self.order_helpers = ThreadPoolExecutor(max_workers=order_parallel, thread_name_prefix="order")
+        self.helpers = ThreadPoolExecutor(max_workers=self.concurrency.ceiling + order_parallel, thread_name_prefix="file-io")
+        self.slot_wakeup = async_engine.SlotWakeup(self.concurrency)
+        try:
+            async with async_engine.create_session(self.concurrency.ceiling) as session:
+                # One coroutine per possible slot; the controller decides how
+                # many of them transfer at the same time.
+                transfers = [
+                    asyncio.create_task(self.transfer_worker(session, ready))
+                    for _ in range(min(self.concurrency.ceiling, len(selected)))
+                ]
+                await asyncio.gather(*[
+                    self.order_worker(pending, ready)
+                    for _ in range(min(order_parallel, len(selected)))
+                ])
+                for _ in transfers:
+                    if not await self.put_ready_async(ready, None):
+                        break
+                await asyncio.gather(*transfers)
+        finally:
+            self.slot_wakeup.close()
+            self.order_helpers.shutdown(wait=False)
+            self.helpers.shutdown(wait=False)
+            while not ready.empty():
+                item = ready.get_nowait()
+                if item is not None:
+                    self.finish_product(item[0], False)
+            if self.cancelled:
+                self.release_unstarted_quota()
+
+    async def put_ready_async(self, ready, item):
+        while not self.cancelled:
+            try:
+                await asyncio.wait_for(ready.put(item), 0.5)
+                return True
+            except asyncio.TimeoutError:
+                continue
+        return False
+
+    async def order_worker(self, pending, ready):
+        while not self.cancelled:
+            try:
+                match = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                await self.order_product_async(match, ready)
+            except Exception as e:
+                tb = traceback.format_exc()
+                self.signals.error.emit(f"Error during download: {e}\n\n{tb}")
+
+    async def transfer_worker(self, session, ready):
+        while True:
+            try:
+                item = await asyncio.wait_for(ready.get(), 0.5)
+            except asyncio.TimeoutError:
+                if self.cancelled:
+                    return
+                continue
+            if item is None:
+                return
+            match, url = item
+            try:
+                await self.download_product(session, match, url)
+                self.progress.flush()
+            except Exception as e:
+                tb = traceback.format_exc()
+                self.signals.error.emit(f"Error during download: {e}\n\n{tb}")
+
+    async def blocking(self, function, *args):
+        """Run a blocking file, journal or store call on the file I/O threads."""
+        return await asyncio.get_running_loop().run_in_executor(self.helpers, function, *args)
+
+    async def acquire_quota(self):
+        announced = None
+        while not self.cancelled:
+            acquired, release = await self.blocking(self.quota.try_acquire)
+            if acquired:
+                return True
+            if release != announced:
+                announced = release
+                self.quota_wait(release)
+            await async_engine.sleep_unless(quota.wait_seconds(release), lambda: self.cancelled)
+        return False
+
+    async def order_product_async(self, match, ready):
+        """asyncio counterpart of DownloadEngine.order_product."""
+        file_id = match.results[0]['id']
+        if await self.blocking(self.skip_if_complete, match):
+            return
+        if await self.blocking(self.take_from_store, match):
+            return
+        if not await self.acquire_quota():
+            return
+        with self._counter_lock:
+            self.pending_downloads -= 1
+            self.started_downloads += 1
+            self.unstarted.add(file_id)
+
+        url = await asyncio.get_running_loop().run_in_executor(self.order_helpers, self.resolve_url, match)
+        if url is None:
+            await self.blocking(self.finish_product, match, False)
+            return
+        await self.blocking(self.journal_update, file_id, journal.DOWNLOADING, url)
+        if not await self.put_ready_async(ready, (match, url)):
+            await self.blocking(self.finish_product, match, False)
+
+    async def download_product(self, session, match, url):
+        file_id = match.results[0]['id']
+        self.signals.status.emit(f"Downloading {file_id}...")
+        ok = False
+        retries = self.retry_policy.begin()
+        while not self.cancelled:
+            error = None
+            if not await async_engine.acquire_slot(self.concurrency, lambda: self.cancelled, self.slot_wakeup):
+                break
+            with self._counter_lock:
+                self.unstarted.discard(file_id)
+            try:
+                ok = await self.fetch_file(session, match, url, retries.attempt)
+            except Exception as e:
+                error = e
+            finally:
+                self.concurrency.release()
+            if error is None or self.cancelled:
+                break
+
+            if async_engine.is_timeout(error):
+                self.concurrency.record_failure()
+            delay = retries.next_delay(getattr(error, "retry_after", None))
+            if delay is None:
+                log_message(f"{self.LOG_PREFIX} Attempt {retries.attempt} ERROR for {file_id}: {error!r}. All attempts failed", "Copernicus Connect", "CRITICAL")
+                break
+            log_message(f"{self.LOG_PREFIX} Attempt {retries.attempt - 1} ERROR for {file_id}: {error!r}. Retrying in {delay:.1f} s", "Copernicus Connect", "WARNING")
+            if await async_engine.sleep_unless(delay, lambda: self.cancelled):
+                break
+
+        await self.blocking(self.finish_product, match, ok)
+
+    async def fetch_file(self, session, match, url, attempt):
+        """asyncio counterpart of DownloadEngine.download_file."""
+        file_id = match.results[0]['id']
+        destination_path = self.destination_path(match)
+        headers = {"Authorization": f"Bearer {self.client.token}"}
+        request_headers, offset = await self.blocking(transfer.prepare_resume, destination_path, headers)
+        loop = asyncio.get_running_loop()
+        async with session.get(url, headers=request_headers) as response:
+            # The loop thread may be awaiting the body; close it from there
+            abort = lambda: loop.call_soon_threadsafe(response.close)
+            with self.cancel_event.track(response, abort):
+                info = async_engine.response_info(response)
+                # Checking the response may finalize or discard the part
+                # file, and preparing the body may verify the file on disk
+                outcome = await self.blocking(self.check_response, file_id, destination_path, info, offset)
+                if outcome is not None:
+                    return outcome
+                prepared = await self.blocking(self.prepare_body, match, destination_path, info, offset)
+                if prepared is None:
+                    return True
+                start, total, state, unzipper = prepared
+                size = await async_engine.write_stream(
+                    response,
+                    destination_path,
+                    start,
+                    total,
+                    state,
+                    lambda: self.cancelled,
+                    chunk_size=self.settings["chunk_size_kb"] * 1024,
+                    buffer_size=self.settings["write_buffer_kb"] * 1024,
+                    allocate=self.settings["preallocate"],
+                    on_bytes=lambda count: self.record_bytes(file_id, count),
+                    on_chunk=unzipper.feed if unzipper is not None else None,
+                    limiter=self.limiter,
+                    blocking=self.blocking,
+                )
+        return await self.blocking(self.complete_body, file_id, destination_path, size, total, attempt)
+
+
+def create_download_engine(matches, client, query, selected_ids, out_dir, batch_id=None, signals=None, settings=None):
+    """Create the download engine chosen in `settings`, by default the saved download settings."""
+    settings = settings or load_download_settings()
+    if settings["engine"] == "asyncio":
+        if async_engine.AVAILABLE:
+            return AsyncDownloadEngine(matches, client, query, selected_ids, out_dir, batch_id, signals, settings)
+        log_message("aiohttp is not installed, using the thread download engine", "Copernicus Connect", "WARNING")
+    return DownloadEngine(matches, client, query, selected_ids, out_dir, batch_id, signals, settings)
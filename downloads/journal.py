@@ -0,0 +1,149 @@
+"""On-disk journal of download batches.
+
+The journal is a small SQLite database inside the download directory. It
+records every product queued for download together with its search
+feature, so an interrupted batch can be resumed after a restart of QGIS
+without running the search again.
+"""
+
+import datetime
+import json
+import os
+import sqlite3
+import threading
+
+JOURNAL_FILENAME = ".copernicus_connect_journal.sqlite"
+
+QUEUED = "queued"
+DOWNLOADING = "downloading"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created TEXT NOT NULL,
+    dataset_id TEXT,
+    query TEXT,
+    dismissed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS items (
+    batch_id INTEGER NOT NULL REFERENCES batches(id),
+    position INTEGER NOT NULL,
+    product_id TEXT NOT NULL,
+    url TEXT,
+    size INTEGER,
+    bytes_done INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    PRIMARY KEY (batch_id, product_id)
+);
+"""
+
+
+class DownloadJournal:
+    def __init__(self, out_dir):
+        self.path = os.path.join(str(out_dir), JOURNAL_FILENAME)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def start_batch(self, dataset_id, query, features):
+        """Record a new batch of features and return its id."""
+        created = datetime.datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute("BEGIN")
+            cursor.execute(
+                "INSERT INTO batches (created, dataset_id, query) VALUES (?, ?, ?)",
+                (created, dataset_id, json.dumps(query)),
+            )
+            batch_id = cursor.lastrowid
+            cursor.executemany(
+                "INSERT OR IGNORE INTO items (batch_id, position, product_id, size, status, feature) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        batch_id,
+                        position,
+                        feature["id"],
+                        _feature_size(feature),
+                        QUEUED,
+                        json.dumps(feature),
+                    )
+                    for position, feature in enumerate(features)
+                ],
+            )
+            cursor.execute("COMMIT")
+        return batch_id
+
+    def set_status(self, batch_id, product_id, status, url=None):
+        with self._lock:
+            if url is None:
+                self._conn.execute(
+                    "UPDATE items SET status = ? WHERE batch_id = ? AND product_id = ?",
+                    (status, batch_id, product_id),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE items SET status = ?, url = ? WHERE batch_id = ? AND product_id = ?",
+                    (status, url, batch_id, product_id),
+                )
+
+    def set_bytes_done(self, batch_id, product_id, bytes_done):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE items SET bytes_done = ? WHERE batch_id = ? AND product_id = ?",
+                (int(bytes_done), batch_id, product_id),
+            )
+
+    def dismiss_batch(self, batch_id):
+        with self._lock:
+            self._conn.execute("UPDATE batches SET dismissed = 1 WHERE id = ?", (batch_id,))
+
+    def unfinished_batches(self):
+        """Return summaries of batches that still have products left to download."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT b.id, b.created, b.dataset_id, b.query, "
+                "SUM(i.status != ?), COUNT(*), "
+                "SUM(CASE WHEN i.status != ? THEN COALESCE(i.size, 0) - i.bytes_done ELSE 0 END) "
+                "FROM batches b JOIN items i ON i.batch_id = b.id "
+                "WHERE b.dismissed = 0 GROUP BY b.id "
+                "HAVING SUM(i.status != ?) > 0 ORDER BY b.id",
+                (DONE, DONE, DONE),
+            ).fetchall()
+        return [
+            {
+                "batch_id": batch_id,
+                "created": created,
+                "dataset_id": dataset_id,
+                "query": json.loads(query) if query else None,
+                "remaining": remaining,
+                "total": total,
+                "remaining_bytes": max(0, remaining_bytes or 0),
+            }
+            for batch_id, created, dataset_id, query, remaining, total, remaining_bytes in rows
+        ]
+
+    def batch_features(self, batch_id, unfinished_only=True):
+        """Return the stored features of a batch in their original order."""
+        sql = "SELECT feature FROM items WHERE batch_id = ?"
+        params = [batch_id]
+        if unfinished_only:
+            sql += " AND status != ?"
+            params.append(DONE)
+        sql += " ORDER BY position"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [json.loads(feature) for (feature,) in rows]
+
+
+def _feature_size(feature):
+    size = feature.get("properties", {}).get("size")
+    return size if isinstance(size, int) else None
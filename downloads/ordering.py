@@ -0,0 +1,34 @@
+"""Order in which the products of a batch are started.
+
+With products of very different sizes, starting them in search result
+order can leave a few large transfers running alone at the end of a
+batch. Starting the largest first (longest processing time first) keeps
+all slots busy until the end; smallest first finishes many products
+early. Sorting is stable, so products of equal size keep their order.
+"""
+
+LARGEST_FIRST = "largest"
+SMALLEST_FIRST = "smallest"
+USER_ORDER = "user"
+
+STRATEGIES = (LARGEST_FIRST, SMALLEST_FIRST, USER_ORDER)
+
+
+def feature_size(feature):
+    size = feature.get("properties", {}).get("size")
+    return size if isinstance(size, int) and size >= 0 else None
+
+
+def order_products(items, strategy, size_of):
+    """Return `items` in the order given by `strategy`.
+
+    `size_of` maps an item to its size in bytes or None. Products of
+    unknown size are treated as large: they start first with
+    LARGEST_FIRST and last with SMALLEST_FIRST.
+    """
+    items = list(items)
+    if strategy == LARGEST_FIRST:
+        return sorted(items, key=lambda item: (size_of(item) is not None, -(size_of(item) or 0)))
+    if strategy == SMALLEST_FIRST:
+        return sorted(items, key=lambda item: (size_of(item) is None, size_of(item) or 0))
+    return items
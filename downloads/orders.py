@@ -0,0 +1,69 @@
+"""Placing and polling HDA data orders ahead of the transfers.
+
+Before a product can be downloaded, HDA may have to prepare it: the
+client posts an order to dataaccess/download and polls it with HEAD
+requests until the server answers 200. hda's SearchResults does this
+inside get_download_urls with a blocking sleep. Here the same steps are
+split out, so orders can be placed by their own small pool with a
+cancellable, jittered poll and feed ready URLs to the transfers.
+"""
+
+import random
+import time
+
+ORDER_ACTION = "dataaccess/download"
+
+
+class OrderFailed(Exception):
+    """HDA reported that an order cannot be completed."""
+
+
+class OrderCancelled(Exception):
+    """The batch was cancelled while an order was being prepared."""
+
+
+def order_query(dataset_id, feature):
+    return {
+        "dataset_id": dataset_id,
+        "product_id": feature["id"],
+        "location": feature["properties"]["location"],
+    }
+
+
+class OrderResolver:
+    def __init__(self, client, poll_interval=1.0, poll_max=30.0, timeout=3600.0):
+        self.client = client
+        self.poll_interval = poll_interval
+        self.poll_max = poll_max
+        self.timeout = timeout
+
+    def place(self, dataset_id, feature):
+        """Post the order of one product and return its download id."""
+        result = self.client.post(order_query(dataset_id, feature), ORDER_ACTION)
+        return result["download_id"]
+
+    def download_url(self, download_id):
+        return self.client.full_url(f"{ORDER_ACTION}/{download_id}")
+
+    def resolve(self, dataset_id, feature, cancel_event):
+        """Order a product and wait until it is ready. Returns its download URL.
+
+        The poll interval grows by half after every check up to poll_max,
+        with jitter so parallel orders do not poll in lockstep. Raises
+        OrderCancelled when `cancel_event` is set, OrderFailed when the
+        server gives up on the order or it takes longer than `timeout`.
+        """
+        download_id = self.place(dataset_id, feature)
+        deadline = time.monotonic() + self.timeout
+        delay = self.poll_interval
+        while True:
+            if cancel_event.wait(random.uniform(0.5, 1.0) * delay):
+                raise OrderCancelled(feature["id"])
+            response = self.client.head(ORDER_ACTION, download_id)
+            if response.status_code == 200:
+                return self.download_url(download_id)
+            if response.status_code != 202:
+                raise OrderFailed(f"order {download_id} answered HTTP {response.status_code}")
+            if time.monotonic() > deadline:
+                raise OrderFailed(f"order {download_id} not ready after {self.timeout:.0f} s")
+            delay = min(self.poll_max, delay * 1.5)
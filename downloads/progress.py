@@ -0,0 +1,131 @@
+"""Byte-level progress of a download batch.
+
+ByteProgress aggregates the bytes written by all concurrent transfers,
+keyed by product id, and reports percent done, current and average
+throughput and an ETA. Updates are coalesced: the `emit` callback is
+called at most once per `interval` seconds, however many chunks arrive.
+"""
+
+import threading
+import time
+from collections import deque
+
+# Seconds of history used for the "current" throughput
+CURRENT_WINDOW = 5.0
+
+
+class ByteProgress:
+    def __init__(self, emit=None, interval=0.25):
+        self.emit = emit
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._expected = {}
+        self._done = {}
+        self._finished = set()
+        self._started = time.monotonic()
+        self._transferred = 0  # bytes moved over the network in this batch
+        self._samples = deque()  # (time, transferred)
+        self._last_emit = 0.0
+
+    def set_expected(self, key, size):
+        """Set the expected size of a product (None when unknown)."""
+        with self._lock:
+            self._expected[key] = size if isinstance(size, int) and size >= 0 else None
+            self._done.setdefault(key, 0)
+
+    def set_done(self, key, count):
+        """Set the bytes of a product already on disk, e.g. when resuming or restarting."""
+        with self._lock:
+            self._done[key] = count
+        self._maybe_emit()
+
+    def add(self, key, count):
+        """Account `count` bytes written for `key` in this batch."""
+        with self._lock:
+            self._done[key] = self._done.get(key, 0) + count
+            self._transferred += count
+        self._maybe_emit()
+
+    def finish(self, key):
+        with self._lock:
+            self._finished.add(key)
+            if self._expected.get(key) is None:
+                self._expected[key] = self._done.get(key, 0)
+            else:
+                self._done[key] = self._expected[key]
+        self._maybe_emit(force=True)
+
+    def done_for(self, key):
+        with self._lock:
+            return self._done.get(key, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return self._snapshot(time.monotonic())
+
+    def flush(self):
+        """Emit the current state regardless of the coalescing interval."""
+        self._maybe_emit(force=True)
+
+    def _snapshot(self, now):
+        known = [key for key, size in self._expected.items() if size is not None]
+        total = sum(self._expected[key] for key in known)
+        done = sum(min(self._done.get(key, 0), self._expected[key]) for key in known)
+        files_total = len(self._expected)
+        files_done = len(self._finished)
+
+        self._samples.append((now, self._transferred))
+        while len(self._samples) > 2 and now - self._samples[0][0] > CURRENT_WINDOW:
+            self._samples.popleft()
+        first_time, first_bytes = self._samples[0]
+        current = (self._transferred - first_bytes) / (now - first_time) if now > first_time else 0.0
+        elapsed = now - self._started
+        average = self._transferred / elapsed if elapsed > 0 else 0.0
+
+        if total:
+            percent = int(done * 100 / total)
+        elif files_total:
+            percent = int(files_done * 100 / files_total)
+        else:
+            percent = 0
+
+        rate = current or average
+        eta = (total - done) / rate if total and rate > 0 else None
+        return {
+            "bytes_done": done,
+            "bytes_total": total,
+            "files_done": files_done,
+            "files_total": files_total,
+            "percent": max(0, min(100, percent)),
+            "current_bps": current,
+            "average_bps": average,
+            "eta_seconds": eta,
+        }
+
+    def _maybe_emit(self, force=False):
+        if self.emit is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_emit < self.interval:
+                return
+            self._last_emit = now
+            snapshot = self._snapshot(now)
+        self.emit(snapshot)
+
+
+def format_rate(bps):
+    if bps >= 1024 ** 2:
+        return f"{bps / 1024 ** 2:.1f} MB/s"
+    return f"{bps / 1024:.0f} kB/s"
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "unknown"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
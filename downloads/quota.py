@@ -0,0 +1,275 @@
+"""Pacing of downloads under the WEkEO hourly download quota.
+
+WEkEO allows HOURLY_LIMIT downloads per sliding hour. Every started
+download is appended to ~/.hda_download_status as "<timestamp_iso> <count>",
+which is shared by all plugin sessions and CLI runs of the user.
+QuotaScheduler models the quota as a token bucket whose tokens come back
+exactly one window after they were spent, and lets downloads start as
+soon as a token is free instead of refusing a selection that is larger
+than what is left. It reads the status file again under a lock every time
+it takes a token, so batches running in other processes are accounted.
+"""
+
+import datetime
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+STATUS_PATH = Path.home() / ".hda_download_status"
+LOCK_PATH = Path.home() / ".hda_download_status.lock"
+HOURLY_LIMIT = 500
+WINDOW = datetime.timedelta(hours=1)
+
+_file_lock = threading.Lock()
+
+
+@contextmanager
+def history_lock():
+    """Hold the status file against other threads and, where supported, other processes."""
+    with _file_lock:
+        try:
+            handle = open(LOCK_PATH, "a+b")
+        except OSError:
+            handle = None
+        locked = handle is not None and _lock_file(handle)
+        try:
+            yield
+        finally:
+            if locked:
+                _unlock_file(handle)
+            if handle is not None:
+                handle.close()
+
+
+def _lock_file(handle):
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            return True
+        if msvcrt is not None:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+            return True
+    except OSError:
+        pass
+    return False
+
+
+def _unlock_file(handle):
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        elif msvcrt is not None:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+    except OSError:
+        pass
+
+
+def read_download_history(now=None):
+    """Return (timestamp, count) entries of the last hour from the status file."""
+    now = now or datetime.datetime.now()
+    one_hour_ago = now - WINDOW
+    entries = []
+    if STATUS_PATH.is_file():
+        try:
+            with open(STATUS_PATH, 'r') as f:
+                for line in f:
+                    parts = line.strip().split()
+                    if len(parts) == 2:
+                        ts_str, count_str = parts
+                        try:
+                            ts = datetime.datetime.fromisoformat(ts_str)
+                            count = int(count_str)
+                            if ts > one_hour_ago:
+                                entries.append((ts, count))
+                        except Exception:
+                            continue
+        except OSError:
+            pass
+    return entries
+
+
+def record_downloads(count, when=None):
+    """Add an entry to the status file, keeping only entries from the last hour."""
+    with history_lock():
+        _append_history(count, when)
+
+
+def forget_downloads(timestamps):
+    """Remove the entries recorded at `timestamps`, one download each, from the status file."""
+    with history_lock():
+        _forget_history(timestamps)
+
+
+def _append_history(count, when=None):
+    when = when or datetime.datetime.now()
+    entries = read_download_history(when)
+    entries.append((when, int(count)))
+    _write_history(entries)
+
+
+def _forget_history(timestamps):
+    remaining = Counter(timestamps)
+    entries = []
+    for ts, count in read_download_history():
+        dropped = min(count, remaining[ts])
+        remaining[ts] -= dropped
+        if count > dropped:
+            entries.append((ts, count - dropped))
+    _write_history(entries)
+
+
+def _write_history(entries):
+    with open(STATUS_PATH, 'w') as f:
+        for ts, entry_count in entries:
+            f.write(f"{ts.isoformat()} {entry_count}\n")
+
+
+def downloads_left(now=None):
+    """Return (max_allowed, downloads_last_hour) for the hourly quota."""
+    with history_lock():
+        downloads_last_hour = sum(count for _, count in read_download_history(now))
+    return max(0, HOURLY_LIMIT - downloads_last_hour), downloads_last_hour
+
+
+class QuotaScheduler:
+    def __init__(self, limit=HOURLY_LIMIT, window=WINDOW):
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        self._spent = []
+        # Tokens taken by this scheduler, oldest first
+        self._taken = []
+        # Tokens taken while the status file could not be written
+        self._unrecorded = []
+
+    def _refresh(self, now):
+        """Load the tokens spent in the last window by every process. Call with both locks held."""
+        cutoff = now - self.window
+        self._unrecorded = [ts for ts in self._unrecorded if ts > cutoff]
+        spent = list(self._unrecorded)
+        for ts, count in read_download_history(now):
+            spent.extend([ts] * count)
+        self._spent = sorted(ts for ts in spent if ts > cutoff)
+
+    def available(self, now=None):
+        now = now or datetime.datetime.now()
+        with self._lock, history_lock():
+            self._refresh(now)
+            return max(0, self.limit - len(self._spent))
+
+    def next_release(self, now=None):
+        """Datetime at which the next token becomes free (now if one is free)."""
+        now = now or datetime.datetime.now()
+        with self._lock, history_lock():
+            self._refresh(now)
+            if len(self._spent) < self.limit:
+                return now
+            return self._spent[len(self._spent) - self.limit] + self.window
+
+    def eta(self, pending, now=None):
+        """Datetime at which the last of `pending` more downloads can start."""
+        now = now or datetime.datetime.now()
+        with self._lock, history_lock():
+            self._refresh(now)
+            starts = list(self._spent)
+        for _ in range(pending):
+            if len(starts) < self.limit:
+                starts.append(now)
+            else:
+                starts.append(max(now, starts[-self.limit] + self.window))
+        return starts[-1] if pending else now
+
+    def finish_eta(self, pending, remaining_bytes, rate, now=None):
+        """Datetime at which the last of `pending` more downloads should be transferred.
+
+        `remaining_bytes` are the bytes the batch still has to write and
+        `rate` its throughput in bytes per second. The last download is
+        done no earlier than its start plus the transfer of an average
+        product. None when the rate is unknown.
+        """
+        if not rate or rate <= 0:
+            return None
+        now = now or datetime.datetime.now()
+        start = self.eta(pending, now)
+        transfer = datetime.timedelta(seconds=remaining_bytes / rate)
+        last = datetime.timedelta(seconds=remaining_bytes / max(pending, 1) / rate)
+        return max(now + transfer, start + last)
+
+    def try_acquire(self):
+        """Take a token if one is free.
+
+        The status file is read again and the token recorded in it under
+        one lock, so two processes cannot both take the last token.
+        Returns (True, None) on success and (False, release) otherwise, where
+        release is the datetime at which the next token becomes free.
+        """
+        now = datetime.datetime.now()
+        with self._lock, history_lock():
+            self._refresh(now)
+            if len(self._spent) >= self.limit:
+                return False, self._spent[len(self._spent) - self.limit] + self.window
+            self._spent.append(now)
+            self._taken.append(now)
+            try:
+                _append_history(1, now)
+            except OSError:
+                self._unrecorded.append(now)
+        return True, None
+
+    def release(self, count):
+        """Give back the last `count` tokens taken here, for downloads that never started."""
+        with self._lock, history_lock():
+            count = min(count, len(self._taken))
+            if count <= 0:
+                return
+            released = self._taken[-count:]
+            del self._taken[-count:]
+            recorded = []
+            for ts in released:
+                if ts in self._spent:
+                    self._spent.remove(ts)
+                if ts in self._unrecorded:
+                    self._unrecorded.remove(ts)
+                else:
+                    recorded.append(ts)
+            try:
+                _forget_history(recorded)
+            except OSError:
+                pass
+
+    def acquire(self, cancelled=lambda: False, on_wait=None, sleep=time.sleep):
+        """Take a token, waiting for one to be released if needed.
+
+        `on_wait` is called with the release time whenever the call has to
+        wait and the release time changed. `sleep` waits between checks,
+        e.g. the wait of a cancel event so a cancel ends it at once.
+        Returns False if cancelled while waiting.
+        """
+        announced = None
+        while not cancelled():
+            acquired, release = self.try_acquire()
+            if acquired:
+                return True
+            if on_wait and release != announced:
+                announced = release
+                on_wait(release)
+            sleep(wait_seconds(release))
+        return False
+
+
+def wait_seconds(release):
+    """Seconds to sleep before checking a token again, at most one."""
+    return min(1.0, max(0.05, (release - datetime.datetime.now()).total_seconds()))
@@ -0,0 +1,148 @@
+"""Global bandwidth limit for product downloads.
+
+All transfers of all download workers draw from one token bucket, so the
+cap holds for the plugin as a whole however many connections are open.
+The cap can be changed at any time, and an optional schedule applies it
+only in certain hours, e.g. at 50% during office hours and not at all at
+night.
+"""
+
+import datetime
+import threading
+import time
+
+# Seconds of traffic at the full rate that may go out in one burst
+BURST_SECONDS = 0.5
+
+_DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+
+def _parse_time(value):
+    hours, minutes = str(value).split(":")
+    return datetime.time(int(hours), int(minutes))
+
+
+def _days(value):
+    """Weekday numbers of a schedule entry: "all", "weekdays", "weekend" or e.g. "mon-fri,sun"."""
+    value = str(value or "all").lower().replace(" ", "")
+    if value == "all":
+        return set(range(7))
+    if value == "weekdays":
+        return set(range(5))
+    if value == "weekend":
+        return {5, 6}
+    days = set()
+    for part in value.split(","):
+        first, _, last = part.partition("-")
+        first = _DAY_NAMES.index(first[:3])
+        last = _DAY_NAMES.index(last[:3]) if last else first
+        days.update(day % 7 for day in range(first, first + (last - first) % 7 + 1))
+    return days
+
+
+def scheduled_percent(schedule, now=None):
+    """Percent of the cap that applies at `now`, or None when no entry matches.
+
+    Each entry is {"days": "weekdays", "start": "08:00", "end": "18:00",
+    "percent": 50}. An entry whose end is before its start runs past midnight.
+    """
+    now = now or datetime.datetime.now()
+    for entry in schedule or []:
+        try:
+            start = _parse_time(entry["start"])
+            end = _parse_time(entry["end"])
+            days = _days(entry.get("days"))
+            percent = float(entry.get("percent", 100))
+        except (KeyError, ValueError, TypeError):
+            continue
+        current = now.time()
+        if start <= end:
+            active = now.weekday() in days and start <= current < end
+        else:
+            # The part after midnight belongs to the previous day's entry
+            day = now.weekday() if current >= start else (now.weekday() - 1) % 7
+            active = day in days and (current >= start or current < end)
+        if active:
+            return percent
+    return None
+
+
+class BandwidthLimiter:
+    def __init__(self, cap=None, schedule=None):
+        self._lock = threading.Lock()
+        self.cap = cap
+        self.schedule = list(schedule or [])
+        self._tokens = 0.0
+        self._last = time.monotonic()
+
+    def configure(self, cap=None, schedule=None):
+        """Set the cap in bytes per second (None or 0 for unlimited) and the schedule."""
+        with self._lock:
+            self.cap = cap or None
+            self.schedule = list(schedule or [])
+
+    def set_cap(self, cap):
+        with self._lock:
+            self.cap = cap or None
+
+    def current_rate(self, now=None):
+        """Bytes per second allowed right now, or None when unlimited.
+
+        Without a schedule the cap always applies. With one, the cap is
+        scaled by the matching entry and lifted outside all entries.
+        """
+        if not self.cap:
+            return None
+        if not self.schedule:
+            return self.cap
+        percent = scheduled_percent(self.schedule, now)
+        if percent is None:
+            return None
+        return max(1.0, self.cap * percent / 100.0)
+
+    def reserve(self, count):
+        """Account `count` bytes and return the seconds the caller should wait.
+
+        Tokens may go negative: a large chunk is let through and the debt
+        delays the next callers, which keeps the average at the rate.
+        """
+        rate = self.current_rate()
+        with self._lock:
+            now = time.monotonic()
+            if not rate:
+                self._tokens = 0.0
+                self._last = now
+                return 0.0
+            capacity = rate * BURST_SECONDS
+            self._tokens = min(capacity, self._tokens + (now - self._last) * rate)
+            self._last = now
+            self._tokens -= count
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / rate
+
+    def consume(self, count, cancel_event=None):
+        """Account `count` bytes and block until they fit in the limit.
+
+        Returns False when `cancel_event` was set while waiting.
+        """
+        delay = self.reserve(count)
+        if delay <= 0:
+            return True
+        if cancel_event is not None:
+            return not cancel_event.wait(delay)
+        time.sleep(delay)
+        return True
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """Return the bandwidth limiter shared by all download workers."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = BandwidthLimiter()
+        return _limiter
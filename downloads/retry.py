@@ -0,0 +1,80 @@
+"""Retry policy for download attempts.
+
+Retries wait with exponential backoff and "full jitter": retry n sleeps a
+random time between zero and min(cap, base * 2**n), so transfers that
+failed together do not come back in lockstep. A Retry-After sent by the
+server takes precedence over the computed delay, and all retries of one
+product share a deadline.
+"""
+
+import datetime
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+
+class TransientError(Exception):
+    """An attempt failed in a way that is worth retrying."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait according to a Retry-After header, or None.
+
+    The header is either a number of seconds or an HTTP date.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if when is None:
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+class RetryPolicy:
+    def __init__(self, attempts=5, base=1.0, cap=60.0, deadline=1800.0):
+        self.attempts = max(1, int(attempts))
+        self.base = float(base)
+        self.cap = float(cap)
+        self.deadline = float(deadline)
+
+    def backoff(self, retry):
+        return random.uniform(0, min(self.cap, self.base * 2 ** retry))
+
+    def begin(self):
+        """Start counting attempts for one operation."""
+        return RetryState(self)
+
+
+class RetryState:
+    def __init__(self, policy):
+        self.policy = policy
+        self.attempt = 1
+        self.started = time.monotonic()
+
+    def next_delay(self, retry_after=None):
+        """Seconds to wait before the next attempt, or None when retries are used up.
+
+        Retries are used up after `attempts` attempts, or when the wait would
+        end after the deadline.
+        """
+        if self.attempt >= self.policy.attempts:
+            return None
+        delay = retry_after if retry_after is not None else self.policy.backoff(self.attempt - 1)
+        remaining = self.policy.deadline - (time.monotonic() - self.started)
+        if delay > remaining:
+            return None
+        self.attempt += 1
+        return delay
@@ -0,0 +1,77 @@
+import json
+from pathlib import Path
+
+CONFIG_PATH = Path.home() / ".hda_download_settings"
+
+DEFAULT_SETTINGS = {
+    # "threads": one thread per transfer; "asyncio": all transfers on one
+    # event loop thread (needs aiohttp), for batches of many small products
+    "engine": "threads",
+    # Order in which products start: "user" (result order), "largest"
+    # first keeps all transfer slots busy until the end, or "smallest" first
+    "order": "user",
+    # Parallel transfers; the actual level adapts between floor and ceiling
+    "concurrency_floor": 1,
+    "concurrency_ceiling": 8,
+    # Split large products into byte ranges fetched over parallel connections
+    "segmented": False,
+    "segments": 4,
+    "segment_threshold_mb": 512,
+    # Bandwidth cap for all downloads together in MB/s (0 = unlimited). With
+    # a schedule such as [{"days": "weekdays", "start": "08:00", "end": "18:00",
+    # "percent": 50}] the cap is scaled in those hours and lifted otherwise.
+    "bandwidth_limit_mb": 0,
+    "bandwidth_schedule": [],
+    # Bytes read from the network per chunk and kept in the file write buffer;
+    # larger values mean fewer system calls, smaller ones suit network shares
+    "chunk_size_kb": 1024,
+    "write_buffer_kb": 4096,
+    # Reserve the full size of a product on disk before writing it
+    "preallocate": True,
+    # Orders placed and polled in parallel, ahead of the transfers; the poll
+    # interval grows from order_poll_interval to order_poll_max seconds
+    "order_parallel": 4,
+    "order_poll_interval": 1.0,
+    "order_poll_max": 30.0,
+    "order_timeout_minutes": 60,
+    # Retries of a failed transfer: exponential backoff with jitter between
+    # retry_base_delay and retry_max_delay seconds, within a total deadline
+    "retry_attempts": 5,
+    "retry_base_delay": 1.0,
+    "retry_max_delay": 60.0,
+    "retry_deadline_minutes": 30,
+    # Unpack ZIP products while they download, keeping only the members that
+    # match the comma separated patterns (all when empty)
+    "extract": False,
+    "extract_patterns": "",
+    "keep_archive": True,
+    # Check products already in the download folder and skip complete ones
+    "verify_existing": True,
+    "verify_checksum": False,
+    "verify_zip_crc": False,
+    # Keep finished downloads in a product store shared by all download
+    # folders, and take products found there from it instead of the network.
+    # Least recently used products are evicted beyond store_budget_gb.
+    "store": False,
+    "store_path": "",
+    "store_budget_gb": 50,
+}
+
+
+def load_download_settings():
+    """Return the saved download settings merged over the defaults."""
+    settings = dict(DEFAULT_SETTINGS)
+    if CONFIG_PATH.is_file():
+        try:
+            with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if isinstance(saved, dict):
+                settings.update({key: value for key, value in saved.items() if key in DEFAULT_SETTINGS})
+        except (OSError, ValueError):
+            pass
+    return settings
+
+
+def save_download_settings(settings):
+    with open(CONFIG_PATH, 'w', encoding='utf-8') as f:
+        json.dump(settings, f, indent=2)
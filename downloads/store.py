@@ -0,0 +1,218 @@
+"""Local content-addressed store of downloaded products.
+
+Overlapping queries of different projects often download the same
+product into different download folders. With the store enabled every
+finished download is also kept under a key made of the product id and
+its checksum (or its size when no checksum is announced). A product
+found in the store is put into the download folder by hardlink, reflink
+or copy, whichever the file system allows first, instead of fetching it
+again. The store has a size budget; the least recently used products are
+evicted when it is exceeded.
+
+The index is a small SQLite database next to the objects.
+"""
+
+import datetime
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from .verify import expected_checksum
+except ImportError:
+    from downloads.verify import expected_checksum
+
+DEFAULT_STORE_PATH = Path.home() / ".hda_product_store"
+INDEX_FILENAME = "index.sqlite"
+
+HARDLINK = "hardlink"
+REFLINK = "reflink"
+COPY = "copy"
+
+# ioctl of Linux file systems with shared extents (Btrfs, XFS)
+_FICLONE = 0x40049409
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    key TEXT PRIMARY KEY,
+    product_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    added TEXT NOT NULL,
+    last_used TEXT NOT NULL
+);
+"""
+
+
+def product_key(feature):
+    """Store key of a search feature, or None when it cannot be identified safely.
+
+    The product id alone is not enough: a reprocessed product can keep its
+    id, so the checksum or the size is part of the key.
+    """
+    checksum = expected_checksum(feature)
+    if checksum is not None:
+        discriminator = ":".join(checksum)
+    else:
+        size = (feature.get("properties", {}) or {}).get("size")
+        if not isinstance(size, int) or size < 0:
+            return None
+        discriminator = f"size:{size}"
+    return hashlib.sha256(f"{feature['id']}\0{discriminator}".encode("utf-8")).hexdigest()
+
+
+def _reflink(source, target):
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+
+
+def link_or_copy(source, target):
+    """Create `target` with the content of `source` as cheaply as possible.
+
+    Tries a hardlink, then a reflink, then a plain copy. The file appears
+    under its final name only when complete. Returns the method used.
+    """
+    temporary = f"{target}.store"
+    for method in (HARDLINK, REFLINK, COPY):
+        try:
+            if os.path.lexists(temporary):
+                os.remove(temporary)
+            if method == HARDLINK:
+                os.link(source, temporary)
+            elif method == REFLINK:
+                _reflink(source, temporary)
+            else:
+                shutil.copyfile(source, temporary)
+            os.replace(temporary, target)
+            return method
+        except OSError:
+            if method == COPY:
+                if os.path.lexists(temporary):
+                    os.remove(temporary)
+                raise
+    return None
+
+
+class ProductStore:
+    def __init__(self, root=None, budget=None):
+        """Open the store at `root`, keeping at most `budget` bytes (None: no limit)."""
+        self.root = Path(root) if root else DEFAULT_STORE_PATH
+        self.budget = budget
+        os.makedirs(self.root / "objects", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.root / INDEX_FILENAME), check_same_thread=False, isolation_level=None)
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def object_path(self, key, name):
+        extension = os.path.splitext(name)[1]
+        return self.root / "objects" / key[:2] / f"{key}{extension}"
+
+    def size(self):
+        """Bytes of all products in the store."""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM products").fetchone()[0]
+
+    def lookup(self, key):
+        """Path of the stored product, or None when it is not (intact) in the store."""
+        with self._lock:
+            row = self._conn.execute("SELECT name, size FROM products WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        path = self.object_path(key, row[0])
+        try:
+            intact = os.path.getsize(path) == row[1]
+        except OSError:
+            intact = False
+        if not intact:
+            self.remove(key)
+            return None
+        return path
+
+    def materialize(self, key, target):
+        """Put the stored product `key` at `target`.
+
+        Returns the method used (HARDLINK, REFLINK or COPY), or None when
+        the product is not in the store.
+        """
+        path = self.lookup(key)
+        if path is None:
+            return None
+        os.makedirs(os.path.dirname(str(target)) or ".", exist_ok=True)
+        method = link_or_copy(path, target)
+        self._touch(key)
+        return method
+
+    def add(self, key, path, product_id):
+        """Keep a copy of the finished download at `path` under `key`.
+
+        Products larger than the whole budget are not stored. Returns True
+        when the product is in the store afterwards.
+        """
+        size = os.path.getsize(path)
+        if self.budget is not None and size > self.budget:
+            return False
+        if self.lookup(key) is not None:
+            self._touch(key)
+            return True
+        name = os.path.basename(str(path))
+        target = self.object_path(key, name)
+        os.makedirs(target.parent, exist_ok=True)
+        link_or_copy(path, target)
+        now = datetime.datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO products (key, product_id, name, size, added, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, product_id, name, size, now, now),
+            )
+        self.evict(keep=key)
+        return True
+
+    def remove(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT name FROM products WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("DELETE FROM products WHERE key = ?", (key,))
+        if row is not None:
+            try:
+                os.remove(self.object_path(key, row[0]))
+            except OSError:
+                pass
+
+    def evict(self, keep=None):
+        """Remove least recently used products until the store fits its budget.
+
+        Returns the number of bytes freed. `keep` is never evicted.
+        """
+        if self.budget is None:
+            return 0
+        with self._lock:
+            rows = self._conn.execute("SELECT key, size FROM products ORDER BY last_used, added").fetchall()
+        excess = sum(size for _, size in rows) - self.budget
+        freed = 0
+        for key, size in rows:
+            if freed >= excess:
+                break
+            if key == keep:
+                continue
+            self.remove(key)
+            freed += size
+        return freed
+
+    def _touch(self, key):
+        now = datetime.datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute("UPDATE products SET last_used = ? WHERE key = ?", (now, key))
@@ -0,0 +1,417 @@
+"""HTTP transfer helpers for downloading HDA products.
+
+These helpers contain no Qt code so they can be shared by the download
+worker and anything else that needs to move product bytes to disk.
+"""
+
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+# Sidecar written next to a partially downloaded file. It keeps the
+# validators (ETag / Last-Modified) of the response the bytes came from,
+# so a later attempt can ask the server to continue with a Range request.
+RESUME_SUFFIX = ".resume"
+# Bytes are written to "<file>.part" and renamed into place once complete,
+# so a file with the final name is always a finished download.
+PART_SUFFIX = ".part"
+# Bytes written between two updates of the committed offset in the sidecar
+COMMIT_INTERVAL = 16 * 1024 * 1024
+
+_CONTENT_RANGE_RE = re.compile(r"bytes\s+(?:(\d+)-(\d+)|\*)/(\d+|\*)")
+
+
+def resume_path(path):
+    return f"{path}{RESUME_SUFFIX}"
+
+
+def part_path(path):
+    return f"{path}{PART_SUFFIX}"
+
+
+def finalize_part(path):
+    """Move the completed part file into place and forget its resume state."""
+    os.replace(part_path(path), path)
+    clear_resume_state(path)
+
+
+def discard_part(path):
+    for leftover in (part_path(path), resume_path(path)):
+        try:
+            os.remove(leftover)
+        except OSError:
+            pass
+
+
+def preallocate(f, size):
+    """Reserve `size` bytes for the open file `f`.
+
+    posix_fallocate reserves the blocks up front, which keeps large products
+    contiguous and fails early when the disk is full. Where it is not
+    available (Windows, some network shares) the file is only extended.
+    """
+    f.flush()
+    current = os.fstat(f.fileno()).st_size
+    if current > size:
+        f.truncate(size)
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except (AttributeError, OSError):
+        if current < size:
+            f.truncate(size)
+
+
+def load_resume_state(path):
+    """Return the saved resume state for `path`, or an empty dict."""
+    try:
+        with open(resume_path(path), "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_resume_state(path, state):
+    try:
+        with open(resume_path(path), "w", encoding="utf-8") as f:
+            json.dump(state, f)
+    except OSError:
+        pass
+
+
+def clear_resume_state(path):
+    try:
+        os.remove(resume_path(path))
+    except OSError:
+        pass
+
+
+def response_validators(response):
+    """Extract the validators that identify the representation being served."""
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+def if_range_value(state):
+    """Pick the validator to send in If-Range.
+
+    Weak ETags are not allowed in If-Range, so Last-Modified is used instead.
+    """
+    etag = state.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return state.get("last_modified")
+
+
+def parse_content_range(value):
+    """Parse a Content-Range header into (start, end, total).
+
+    Unknown parts are None, e.g. "bytes */1234" (sent with a 416) gives
+    (None, None, 1234).
+    """
+    match = _CONTENT_RANGE_RE.match(value or "")
+    if not match:
+        return None
+    return tuple(None if part in (None, "*") else int(part) for part in match.groups())
+
+
+def prepare_resume(path, headers):
+    """Build request headers for (re)starting the download of `path`.
+
+    Returns (headers, offset). The offset is the number of bytes of the part
+    file that were committed and that the server is asked to skip; it is 0
+    when nothing usable is present or when no validator was saved.
+    """
+    headers = dict(headers)
+    try:
+        on_disk = os.path.getsize(part_path(path))
+    except OSError:
+        on_disk = 0
+
+    state = load_resume_state(path)
+    validator = if_range_value(state)
+    # The part file is preallocated, so only the committed offset says how
+    # many bytes are valid. Segmented downloads track their own progress.
+    committed = state.get("committed")
+    offset = min(committed, on_disk) if isinstance(committed, int) else 0
+    if offset and validator and not state.get("segments"):
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = validator
+        return headers, offset
+    return headers, 0
+
+
+def response_start(response, offset):
+    """Return the byte offset the body of `response` starts at.
+
+    A 206 whose Content-Range starts at `offset` continues the partial file.
+    Anything else (a plain 200 because ranges are unsupported or If-Range
+    no longer matches, or a mismatching range) means starting from zero.
+    """
+    if offset and response.status_code == 206:
+        content_range = parse_content_range(response.headers.get("Content-Range"))
+        if content_range and content_range[0] == offset:
+            return offset
+    return 0
+
+
+def expected_total(response, start):
+    """Total size of the representation, if the response tells us."""
+    content_range = parse_content_range(response.headers.get("Content-Range"))
+    if content_range and content_range[2] is not None:
+        return content_range[2]
+    length = response.headers.get("Content-Length")
+    if length and length.isdigit():
+        return start + int(length)
+    return None
+
+
+class PartWriter:
+    """Writes a product into its part file and tracks the committed offset.
+
+    The part file is preallocated to `total` when it is known and written
+    through a buffer of `buffer_size` bytes. The committed offset is saved
+    in the resume sidecar every COMMIT_INTERVAL bytes and on close.
+    """
+
+    def __init__(self, path, start, total, state, buffer_size=4 * 1024 * 1024, allocate=True):
+        self.path = path
+        self.total = total
+        self.state = state
+        self.position = start
+        self._uncommitted = 0
+        part = part_path(path)
+        mode = "r+b" if start and os.path.exists(part) else "w+b"
+        self._file = open(part, mode, buffering=buffer_size)
+        try:
+            if total is not None and allocate:
+                preallocate(self._file, total)
+            self._file.seek(start)
+        except OSError:
+            self._file.close()
+            raise
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self.position += len(chunk)
+        self._uncommitted += len(chunk)
+        if self._uncommitted >= COMMIT_INTERVAL:
+            self._file.flush()
+            self._commit()
+
+    def close(self):
+        """Flush the part file and return the offset reached."""
+        try:
+            self._file.flush()
+            if self.total is None:
+                self._file.truncate(self.position)
+            else:
+                os.fsync(self._file.fileno())
+        finally:
+            self._file.close()
+            self._commit()
+        return self.position
+
+    def _commit(self):
+        self.state["committed"] = self.position
+        save_resume_state(self.path, self.state)
+        self._uncommitted = 0
+
+
+def write_stream(response, path, start, total, state, cancelled,
+                 chunk_size=1024 * 1024, buffer_size=4 * 1024 * 1024,
+                 allocate=True, on_bytes=None, on_chunk=None, throttle=None):
+    """Write the body of `response` into the part file of `path` at `start`.
+
+    Returns the offset reached, which is short of `total` when cancelled
+    or when the connection ended early. `on_chunk` receives every chunk
+    written, e.g. to unpack it on the fly, and `throttle` is called with
+    the size of every chunk and may block to limit the bandwidth.
+    """
+    writer = PartWriter(path, start, total, state, buffer_size, allocate)
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if cancelled():
+                break
+            if not chunk:
+                continue
+            writer.write(chunk)
+            if on_chunk:
+                on_chunk(chunk)
+            if on_bytes:
+                on_bytes(len(chunk))
+            if throttle:
+                throttle(len(chunk))
+    finally:
+        position = writer.close()
+    return position
+
+
+class RangeNotSupported(Exception):
+    """The server does not serve byte ranges for this URL."""
+
+
+def plan_segments(total, count):
+    """Split `total` bytes into at most `count` inclusive (start, end) ranges."""
+    count = max(1, min(int(count), total))
+    size, rest = divmod(total, count)
+    segments = []
+    start = 0
+    for index in range(count):
+        end = start + size + (1 if index < rest else 0) - 1
+        segments.append((start, end))
+        start = end + 1
+    return segments
+
+
+def _untracked(response):
+    return nullcontext(response)
+
+
+def probe_ranges(http_get, url, headers, timeout=60, track=_untracked):
+    """Ask for the first byte to learn whether ranges are served.
+
+    Returns the resume state (validators and total size) of the
+    representation. Raises RangeNotSupported otherwise.
+    """
+    probe_headers = dict(headers)
+    probe_headers["Range"] = "bytes=0-0"
+    response = http_get(url, headers=probe_headers, stream=True, timeout=timeout)
+    with response, track(response):
+        content_range = parse_content_range(response.headers.get("Content-Range"))
+        if response.status_code != 206 or not content_range or content_range[2] is None:
+            raise RangeNotSupported(f"HTTP {response.status_code} for a range request")
+        state = response_validators(response)
+        state["total"] = content_range[2]
+        return state
+
+
+def _write_at(f, data, offset):
+    # Positional write; every segment thread has its own handle, so the
+    # seek based fallback (Windows has no os.pwrite) is safe as well.
+    if hasattr(os, "pwrite"):
+        os.pwrite(f.fileno(), data, offset)
+    else:
+        f.seek(offset)
+        f.write(data)
+
+
+def download_segmented(http_get, url, headers, path, segments, cancelled,
+                       chunk_size=1024 * 1024, timeout=60, on_bytes=None, throttle=None,
+                       track=_untracked, on_resume=None):
+    """Fetch `url` into `path` over several parallel Range requests.
+
+    The part file is preallocated to the full size, each segment is written
+    in place and the part file is renamed to `path` once complete. Progress
+    per segment is kept in the resume sidecar, so a later call continues
+    unfinished segments. Returns True when the file is complete and
+    verified, False when it was interrupted (cancelled or a segment
+    failed). `on_bytes` and `throttle` are called with the size of every
+    written chunk, as in write_stream. `on_resume` is called once with the
+    bytes kept from earlier attempts, which never pass through `on_bytes`.
+    `track` is entered with every response, e.g. CancelToken.track to abort
+    it on cancel. Raises
+    RangeNotSupported when the server ignores ranges, in which case the
+    caller should fall back to a single stream.
+    """
+    probed = probe_ranges(http_get, url, headers, timeout=timeout, track=track)
+    total = probed["total"]
+    part = part_path(path)
+    validator = if_range_value(probed)
+
+    state = load_resume_state(path)
+    reuse = (
+        state.get("segments")
+        and state.get("total") == total
+        and if_range_value(state) == validator
+        and validator
+        and os.path.exists(part)
+        and os.path.getsize(part) == total
+    )
+    if not reuse:
+        state = dict(probed)
+        state["segments"] = [[start, end, 0] for start, end in plan_segments(total, segments)]
+        with open(part, "wb") as f:
+            preallocate(f, total)
+    save_resume_state(path, state)
+
+    lock = threading.Lock()
+
+    def fetch(segment):
+        start, end, done = segment
+        if start + done > end:
+            return True
+        range_headers = dict(headers)
+        range_headers["Range"] = f"bytes={start + done}-{end}"
+        if validator:
+            range_headers["If-Range"] = validator
+        response = http_get(url, headers=range_headers, stream=True, timeout=timeout)
+        try:
+            with track(response):
+                content_range = parse_content_range(response.headers.get("Content-Range"))
+                if response.status_code != 206 or not content_range or content_range[0] != start + done:
+                    # Representation changed under us (If-Range failed) or the
+                    # server stopped honouring ranges.
+                    raise RangeNotSupported(f"HTTP {response.status_code} for segment {start}-{end}")
+                unsaved = 0
+                with open(part, "r+b") as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if cancelled():
+                            return False
+                        if not chunk:
+                            continue
+                        chunk = chunk[:end - (start + done) + 1]
+                        _write_at(f, chunk, start + done)
+                        done += len(chunk)
+                        unsaved += len(chunk)
+                        if on_bytes:
+                            on_bytes(len(chunk))
+                        if throttle:
+                            throttle(len(chunk))
+                        if unsaved >= 8 * chunk_size:
+                            with lock:
+                                segment[2] = done
+                                save_resume_state(path, state)
+                            unsaved = 0
+                        if start + done > end:
+                            break
+        finally:
+            response.close()
+            with lock:
+                segment[2] = done
+                save_resume_state(path, state)
+        return start + done > end
+
+    if on_resume:
+        on_resume(sum(segment[2] for segment in state["segments"]))
+    pending = [segment for segment in state["segments"] if segment[0] + segment[2] <= segment[1]]
+    executor = ThreadPoolExecutor(max_workers=max(1, len(pending)))
+    try:
+        futures = [executor.submit(fetch, segment) for segment in pending]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except RangeNotSupported:
+                clear_resume_state(path)
+                raise
+            except Exception:
+                results.append(False)
+    finally:
+        executor.shutdown(wait=True)
+
+    if not all(results):
+        return False
+
+    # Verify: every segment is complete and the file has the advertised size
+    covered = sum(end - start + 1 for start, end, done in state["segments"] if start + done > end)
+    if covered != total or os.path.getsize(part) != total:
+        discard_part(path)
+        return False
+    finalize_part(path)
+    return True
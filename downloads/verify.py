@@ -0,0 +1,106 @@
+"""Verification of products that are already present in the download folder.
+
+A product found on disk is checked before it is ordered again: its size is
+compared with the size announced by the search result (or the server),
+optionally its checksum, and ZIP archives are opened to make sure the
+central directory is intact. Complete files are skipped, so re-running a
+batch only transfers what is actually missing.
+"""
+
+import hashlib
+import os
+import zipfile
+
+try:
+    from .transfer import resume_path
+except ImportError:
+    from downloads.transfer import resume_path
+
+MISSING = "missing"
+# Shorter than expected or still being downloaded; the bytes may be resumed
+PARTIAL = "partial"
+INVALID = "invalid"
+COMPLETE = "complete"
+# Present, but there is nothing to compare it with
+UNKNOWN = "unknown"
+
+_DIGEST_LENGTHS = {32: "md5", 40: "sha1", 64: "sha256", 128: "sha512"}
+
+
+def expected_checksum(feature):
+    """Return (algorithm, hexdigest) announced for a search feature, or None."""
+    properties = feature.get("properties", {}) or {}
+    checksum = properties.get("checksum")
+    if isinstance(checksum, dict):
+        algorithm = str(checksum.get("algorithm", "")).lower().replace("-", "")
+        value = checksum.get("value")
+        if algorithm in hashlib.algorithms_available and isinstance(value, str):
+            return algorithm, value.lower()
+    elif isinstance(checksum, str) and len(checksum) in _DIGEST_LENGTHS:
+        return _DIGEST_LENGTHS[len(checksum)], checksum.lower()
+    for algorithm in ("sha256", "md5"):
+        value = properties.get(algorithm)
+        if isinstance(value, str):
+            return algorithm, value.lower()
+    return None
+
+
+def file_checksum(path, algorithm, chunk_size=1024 * 1024):
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_zip_path(path):
+    return os.path.splitext(path)[1].lower() == ".zip"
+
+
+def zip_is_valid(path, test_crc=False):
+    """Check that `path` is a readable ZIP archive.
+
+    Opening the archive reads the central directory at the end of the file,
+    which catches truncated downloads. `test_crc` also decompresses every
+    member and checks its CRC, which is thorough but reads the whole file.
+    """
+    try:
+        with zipfile.ZipFile(path) as archive:
+            if test_crc:
+                return archive.testzip() is None
+            return True
+    except (OSError, zipfile.BadZipFile, EOFError, ValueError):
+        return False
+
+
+def verify_existing(path, expected_size=None, checksum=None, check_zip=True, test_crc=False):
+    """Classify the file at `path` as MISSING, PARTIAL, INVALID, COMPLETE or UNKNOWN."""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return MISSING
+    if os.path.exists(resume_path(path)):
+        return PARTIAL
+
+    if expected_size is not None:
+        if size < expected_size:
+            return PARTIAL
+        if size > expected_size:
+            return INVALID
+
+    if checksum is not None:
+        algorithm, value = checksum
+        try:
+            if file_checksum(path, algorithm) != value:
+                return INVALID
+        except (OSError, ValueError):
+            return INVALID
+
+    if check_zip and is_zip_path(path):
+        if not zip_is_valid(path, test_crc):
+            return INVALID
+        return COMPLETE
+
+    if expected_size is None and checksum is None:
+        return UNKNOWN
+    return COMPLETE
@@ -0,0 +1,277 @@
+"""Extraction of ZIP products while they are being downloaded.
+
+StreamingUnzipper is fed the bytes of an archive in download order and
+unpacks the members as their local headers and data arrive, so a large
+product is not read back from disk after the download. Only stored and
+deflated members can be streamed. When an archive uses anything else, or
+the download did not start at byte zero, the caller falls back to
+extract_archive once the file is complete.
+"""
+
+import fnmatch
+import os
+import struct
+import zipfile
+import zlib
+
+# Written into the extraction folder once all members are on disk
+EXTRACTED_MARKER = ".copernicus_connect_extracted"
+
+_LOCAL_HEADER = b"PK\x03\x04"
+_DATA_DESCRIPTOR = b"PK\x07\x08"
+# Central directory, zip64 end records and end of central directory: no
+# more member data follows.
+_END_SIGNATURES = (b"PK\x01\x02", b"PK\x06\x06", b"PK\x06\x07", b"PK\x05\x06")
+_LOCAL_HEADER_STRUCT = struct.Struct("<4sHHHHHIIIHH")
+
+_FLAG_ENCRYPTED = 0x1
+_FLAG_DATA_DESCRIPTOR = 0x8
+_FLAG_UTF8 = 0x800
+
+
+class StreamingNotSupported(Exception):
+    """The archive cannot be extracted from a stream."""
+
+
+def parse_patterns(text):
+    """Split a comma separated list of glob patterns such as "*.jp2, *.nc"."""
+    return [pattern.strip() for pattern in (text or "").split(",") if pattern.strip()]
+
+
+def member_wanted(name, patterns):
+    if not patterns:
+        return True
+    name = name.lower()
+    return any(fnmatch.fnmatch(name, pattern.lower()) for pattern in patterns)
+
+
+def _target_path(dest_dir, name):
+    """Path of member `name` below `dest_dir`, refusing names that escape it."""
+    parts = [part for part in name.replace("\\", "/").split("/") if part not in ("", ".")]
+    if not parts or ".." in parts or ":" in parts[0]:
+        raise StreamingNotSupported(f"unsafe member name {name!r}")
+    return os.path.join(dest_dir, *parts)
+
+
+def _zip64_sizes(extra, csize, usize):
+    """Read the real sizes from a zip64 extra field when the header has 0xFFFFFFFF."""
+    offset = 0
+    while offset + 4 <= len(extra):
+        header_id, length = struct.unpack_from("<HH", extra, offset)
+        if header_id == 0x0001:
+            values = extra[offset + 4:offset + 4 + length]
+            position = 0
+            if usize == 0xFFFFFFFF:
+                usize = struct.unpack_from("<Q", values, position)[0]
+                position += 8
+            if csize == 0xFFFFFFFF:
+                csize = struct.unpack_from("<Q", values, position)[0]
+            return csize, usize, True
+        offset += 4 + length
+    return csize, usize, False
+
+
+class StreamingUnzipper:
+    def __init__(self, dest_dir, patterns=None):
+        self.dest_dir = dest_dir
+        self.patterns = list(patterns or [])
+        self.extracted = []
+        self.finished = False
+        # Reason streaming stopped; the archive must then be extracted from disk
+        self.failed = None
+        self._buffer = bytearray()
+        self._state = "header"
+        self._member = None
+
+    def feed(self, data):
+        if self.finished or self.failed:
+            return
+        self._buffer += data
+        try:
+            self._process()
+        except (StreamingNotSupported, zlib.error, OSError) as e:
+            self.failed = str(e) or type(e).__name__
+            self._close_member(discard=True)
+            self._buffer = bytearray()
+
+    def close(self):
+        """Return True when the whole archive was extracted from the stream."""
+        if not self.finished and not self.failed:
+            self.failed = "archive ended before its central directory"
+        self._close_member(discard=not self.finished)
+        return self.finished and not self.failed
+
+    def _process(self):
+        while True:
+            if self._state == "header":
+                if not self._read_header():
+                    return
+            elif self._state == "data":
+                if not self._read_data():
+                    return
+            elif self._state == "descriptor":
+                if not self._read_descriptor():
+                    return
+            else:
+                return
+
+    def _read_header(self):
+        if len(self._buffer) < 4:
+            return False
+        signature = bytes(self._buffer[:4])
+        if signature in _END_SIGNATURES:
+            self.finished = True
+            self._state = "done"
+            self._buffer = bytearray()
+            return False
+        if signature != _LOCAL_HEADER:
+            raise StreamingNotSupported("unexpected record in archive")
+        if len(self._buffer) < _LOCAL_HEADER_STRUCT.size:
+            return False
+        (_, _, flags, method, _, _, crc, csize, usize,
+         name_length, extra_length) = _LOCAL_HEADER_STRUCT.unpack_from(self._buffer)
+        header_size = _LOCAL_HEADER_STRUCT.size + name_length + extra_length
+        if len(self._buffer) < header_size:
+            return False
+        raw_name = bytes(self._buffer[_LOCAL_HEADER_STRUCT.size:_LOCAL_HEADER_STRUCT.size + name_length])
+        extra = bytes(self._buffer[_LOCAL_HEADER_STRUCT.size + name_length:header_size])
+        del self._buffer[:header_size]
+
+        name = raw_name.decode("utf-8" if flags & _FLAG_UTF8 else "cp437")
+        if flags & _FLAG_ENCRYPTED:
+            raise StreamingNotSupported(f"{name} is encrypted")
+        if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise StreamingNotSupported(f"{name} uses compression method {method}")
+        csize, usize, zip64 = _zip64_sizes(extra, csize, usize)
+        descriptor = bool(flags & _FLAG_DATA_DESCRIPTOR)
+        if descriptor and method == zipfile.ZIP_STORED:
+            # Nothing tells where stored data without sizes ends
+            raise StreamingNotSupported(f"{name} is stored without sizes")
+
+        wanted = not name.endswith("/") and member_wanted(name, self.patterns)
+        output = None
+        path = None
+        if wanted:
+            path = _target_path(self.dest_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            output = open(path, "wb")
+        elif name.endswith("/") and not self.patterns:
+            os.makedirs(_target_path(self.dest_dir, name), exist_ok=True)
+
+        self._member = {
+            "name": name,
+            "path": path,
+            "method": method,
+            "crc": crc,
+            "descriptor": descriptor,
+            "zip64": zip64,
+            # Compressed bytes left, None when only the data descriptor knows
+            "remaining": None if descriptor else csize,
+            "decompressor": zlib.decompressobj(-15) if method == zipfile.ZIP_DEFLATED else None,
+            "output": output,
+            "running_crc": 0,
+        }
+        self._state = "data"
+        return True
+
+    def _write(self, data):
+        member = self._member
+        if member["output"] is not None and data:
+            member["output"].write(data)
+            member["running_crc"] = zlib.crc32(data, member["running_crc"])
+
+    def _read_data(self):
+        member = self._member
+        if member["remaining"] is None:
+            # Deflate stream of unknown length: it ends where the decompressor says
+            if not self._buffer:
+                return False
+            decompressor = member["decompressor"]
+            self._write(decompressor.decompress(bytes(self._buffer)))
+            self._buffer = bytearray()
+            if not decompressor.eof:
+                return False
+            self._buffer = bytearray(decompressor.unused_data)
+            self._state = "descriptor"
+            return True
+
+        count = min(len(self._buffer), member["remaining"])
+        if count:
+            piece = bytes(memoryview(self._buffer)[:count])
+            del self._buffer[:count]
+            member["remaining"] -= count
+            if member["output"] is not None:
+                if member["decompressor"] is not None:
+                    self._write(member["decompressor"].decompress(piece))
+                else:
+                    self._write(piece)
+        if member["remaining"]:
+            return False
+        if member["output"] is not None and member["decompressor"] is not None:
+            self._write(member["decompressor"].flush())
+        if member["descriptor"]:
+            self._state = "descriptor"
+        else:
+            self._finish_member(member["crc"])
+        return True
+
+    def _read_descriptor(self):
+        size = 20 if self._member["zip64"] else 12
+        if len(self._buffer) < 4:
+            return False
+        skip = 4 if bytes(self._buffer[:4]) == _DATA_DESCRIPTOR else 0
+        if len(self._buffer) < skip + size:
+            return False
+        crc = struct.unpack_from("<I", self._buffer, skip)[0]
+        del self._buffer[:skip + size]
+        self._finish_member(crc)
+        return True
+
+    def _finish_member(self, crc):
+        member = self._member
+        if member["output"] is not None:
+            self._close_member()
+            if member["running_crc"] != crc:
+                os.remove(member["path"])
+                raise StreamingNotSupported(f"CRC mismatch in {member['name']}")
+            self.extracted.append(member["path"])
+        self._member = None
+        self._state = "header"
+
+    def _close_member(self, discard=False):
+        member = self._member
+        if member is None or member["output"] is None:
+            return
+        member["output"].close()
+        member["output"] = None
+        if discard:
+            try:
+                os.remove(member["path"])
+            except OSError:
+                pass
+
+
+def extract_archive(path, dest_dir, patterns=None):
+    """Extract the members of the archive at `path` that match `patterns`."""
+    extracted = []
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not member_wanted(info.filename, patterns):
+                continue
+            extracted.append(archive.extract(info, dest_dir))
+    return extracted
+
+
+def mark_extracted(dest_dir, archive_size):
+    os.makedirs(dest_dir, exist_ok=True)
+    with open(os.path.join(dest_dir, EXTRACTED_MARKER), "w", encoding="utf-8") as f:
+        f.write(str(int(archive_size)))
+
+
+def extracted_size(dest_dir):
+    """Size of the archive that was extracted into `dest_dir`, or None."""
+    try:
+        with open(os.path.join(dest_dir, EXTRACTED_MARKER), "r", encoding="utf-8") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
@@ -1,7 +1,11 @@
-import requests
 import re
 from urllib.parse import urlparse, urlunparse
 
+try:
+    from .http_session import get_session
+except ImportError:
+    from http_session import get_session
+
 REQUEST_TIMEOUT = 60
 
 
@@ -87,7 +91,7 @@ class GetBaseURL:
         dataset_id = self.transform_dataset_id(dataset_id)
         url = f"{self.BASE_URL}/{dataset_id}"
         try:
-            response = requests.get(url, timeout=REQUEST_TIMEOUT)
+            response = get_session().get(url, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -0,0 +1,51 @@
+"""Plugin-wide HTTP session with keep-alive connection pooling.
+
+All plain HTTP traffic of the plugin (product downloads, thumbnails,
+dataset metadata, terms) goes through one `requests.Session`, so repeated
+requests to the same host reuse open TCP/TLS connections instead of paying
+for a new handshake every time. Authorization headers are always passed
+per request and never stored on the shared session.
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 10
+
+_lock = threading.Lock()
+_session = None
+_pool_size = DEFAULT_POOL_SIZE
+
+
+def _mount(session, pool_size):
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+def get_session():
+    """Return the shared session, creating it on first use."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            _mount(_session, _pool_size)
+        return _session
+
+
+def configure_pool(size):
+    """Make sure every host can keep at least `size` connections open.
+
+    The pool only grows: replacing the adapter drops its idle connections,
+    which is exactly what the pool is there to avoid.
+    """
+    global _pool_size
+    size = max(1, int(size))
+    with _lock:
+        if size <= _pool_size:
+            return
+        _pool_size = size
+        if _session is not None:
+            _mount(_session, size)
@@ -4,12 +4,22 @@ try:
     from .user_dialog import UserDialog
     from .path_dialog import PathDialog
     from .limit_dialog import LimitDialog
+    from .download_dialog import DownloadDialog
+    from .search_dialog import SearchDialog
     from .widgets.bbox_widget import BoundingBoxWidget
     from .get_wms import WMSCapabilitiesParser
     from .get_wmts import WMTSCapabilitiesParser
     from  .get_base_url import GetBaseURL
     from .terms_dialog import TermsDialog
     from .loading_overlay import LoadingOverlay
+    from .results_model import ResultsModel
+    from .downloads import journal, quota, ratelimit
+    from .downloads.engine import create_download_engine, set_log_handler
+    from .downloads.progress import format_eta, format_rate
+    from .downloads.settings import load_download_settings, save_download_settings
+    from .http_session import get_session
+    from .search import cache as search_cache, strategy, tiles
+    from .search.settings import load_search_settings
     running_in_qgis = True
 
     def _alias_qgis_enum(legacy_name, enum_name):
@@ -38,12 +48,22 @@ except ImportError as e:
     from user_dialog import UserDialog
     from path_dialog import PathDialog
     from limit_dialog import LimitDialog
+    from download_dialog import DownloadDialog
+    from search_dialog import SearchDialog
     from widgets.bbox_widget import BoundingBoxWidget
     from get_wms import WMSCapabilitiesParser
     from get_wmts import WMTSCapabilitiesParser
     from  get_base_url import GetBaseURL
     from terms_dialog import TermsDialog
     from loading_overlay import LoadingOverlay
+    from results_model import ResultsModel
+    from downloads import journal, quota, ratelimit
+    from downloads.engine import create_download_engine, set_log_handler
+    from downloads.progress import format_eta, format_rate
+    from downloads.settings import load_download_settings, save_download_settings
+    from http_session import get_session
+    from search import cache as search_cache, strategy, tiles
+    from search.settings import load_search_settings
     running_in_qgis = False
     
     def log_message(msg, tag="Copernicus Connect", level="INFO"):
@@ -52,6 +72,8 @@ except ImportError as e:
         QgsProject = None
     
 
+set_log_handler(log_message)
+
 import sys
 import os
 import json
@@ -60,14 +82,12 @@ import time
 import webbrowser
 import platform
 import subprocess
-import threading
 from pathlib import Path
 from urllib.parse import urlencode
 from collections import defaultdict
 from io import BytesIO
-from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout, CancelledError
-import traceback
 from hda import Client, Configuration
+from hda.api import SearchResults
 
 try:
     from .qt_compat import (
@@ -284,125 +304,85 @@ class NullableDateTimeInput(QWidget):
 class DownloadWorkerSignals(QObject):
     progress = pyqtSignal(int)
     status = pyqtSignal(str)
+    concurrency = pyqtSignal(int)
+    transfer = pyqtSignal(dict)
     finished = pyqtSignal()
     error = pyqtSignal(str)
 
 class DownloadWorker(QRunnable):
-    def __init__(self, matches, client, query, selected_ids, out_dir):
+    """Runs a DownloadEngine on the Qt thread pool, reporting through Qt signals."""
+
+    def __init__(self, engine):
         super().__init__()
-        self.matches = matches
-        self.client = client
-        self.query = query
-        self.selected_ids = selected_ids
-        self.out_dir = out_dir
-        self.cancelled = False
-        self.started_downloads = 0
-        self.completed_downloads = 0
-        self.signals = DownloadWorkerSignals()
-        self._counter_lock = threading.Lock()
-        
+        self.engine = engine
+        self.signals = engine.signals
+
     def cancel(self):
-        self.cancelled = True
+        self.engine.cancel()
 
     @pyqtSlot()
     def run(self):
-        try:
-            downloaded = 0
-            futures = []
-            executor = ThreadPoolExecutor(max_workers=4)
+        self.engine.run()
 
-            try:
-                for match in self.matches:
-                    if self.cancelled:
-                        self.signals.status.emit("Download cancelled.")
-                        return
-                    feature_id = match.results[0]['id']
-                    if feature_id in self.selected_ids:
-                        self.signals.status.emit(f"Downloading {feature_id}...")
-                        futures.append(executor.submit(self.download_file, match))
-
-                total = len(futures)
 
-                for future in as_completed(futures):
-                    if self.cancelled:
-                        break
-                    try:
-                        future.result()
-                        downloaded += 1
-                        if total:
-                            progress = int((downloaded / total) * 100)
-                            self.signals.progress.emit(progress)
-                    except CancelledError:
-                        self.signals.status.emit("Download cancelled.")
-                        return
-                    except Exception as e:
-                        tb = traceback.format_exc()
-                        self.signals.error.emit(f"Error during download: {e}\n\n{tb}")
-            finally:
-                self.completed_downloads = downloaded
-                try:
-                    executor.shutdown(wait=False, cancel_futures=True)
-                except TypeError:
-                    executor.shutdown(wait=False)
-                    for f in futures:
-                        f.cancel()
-
-            if self.cancelled:
-                self.signals.status.emit("Download cancelled.")
-            else:
-                self.signals.status.emit("Download finished.")
-
-            self.signals.finished.emit()
+class SearchWorkerSignals(QObject):
+    page = pyqtSignal(list, object)
+    finished = pyqtSignal()
+    error = pyqtSignal(str)
 
-        except Exception as e:
-            tb = traceback.format_exc()
-            self.signals.error.emit(f"Unexpected error: {e}\n\n{tb}")
-
-    def download_file(self, match):
-        url = match.get_download_urls()[0]
-        file_id = match.results[0]['id']
-        location = match.results[0].get("properties", {}).get("location", "")
-        extension = os.path.splitext(location)[1] or ".zip"
-        destination_path = os.path.join(str(self.out_dir), f"{file_id}{extension}")
-        headers = {"Authorization": f"Bearer {self.client.token}"}
-        with self._counter_lock:
-            self.started_downloads += 1
-
-        max_attempts = 3
-
-        for attempt in range(1, max_attempts + 1):
-            try:
-                if self.cancelled:
-                    self.signals.status.emit("Download cancelled.")
-                    return
-              
-                if os.path.exists(destination_path):
-                    os.remove(destination_path)
+class SearchWorker(QRunnable):
+    """Runs a search page by page on the Qt thread pool, emitting every page as it arrives."""
 
-                response = requests.get(url, headers=headers, stream=True, timeout=60)
+    def __init__(self, client, query, limit=None, settings=None):
+        super().__init__()
+        self.client = client
+        self.query = query
+        self.limit = limit
+        self.settings = settings if settings is not None else load_search_settings()
+        self.signals = SearchWorkerSignals()
+        self.cancelled = False
+        # Set when some tiles of a tiled search failed; the pages of the others were emitted
+        self.partial = False
 
-                if response.status_code == 200:
-                    with open(destination_path, "wb") as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            if self.cancelled:
-                                self.signals.status.emit("Download cancelled during file write.")
-                                return
-                            if chunk:
-                                f.write(chunk)
+    def cancel(self):
+        self.cancelled = True
 
-                    log_message(f"[THREAD] Download OK for {file_id} (attempt {attempt})", "Copernicus Connect", "SUCCESS")
-                    return 
+    @pyqtSlot()
+    def run(self):
+        # Overall deadline of the search; every request also has the client timeout
+        minutes = float(self.settings.get("timeout_minutes") or 0)
+        deadline = time.monotonic() + minutes * 60 if minutes > 0 else None
 
-                else:
-                    log_message(f"[THREAD] Attempt {attempt} failed for {file_id} with status code: {response.status_code}", "Copernicus Connect", "ERROR")
+        def expired():
+            return deadline is not None and time.monotonic() > deadline
 
-            except Exception as e:
-                log_message(f"[THREAD] Attempt {attempt} ERROR for {file_id}: {e}", "Copernicus Connect", "CRITICAL")
+        try:
+            for features, total in strategy.run_search(
+                self.client, self.query, self.limit, self.settings, cancelled=lambda: self.cancelled or expired()
+            ):
+                if self.cancelled:
+                    break
+                self.signals.page.emit(features, total)
+                if expired():
+                    break
+        except tiles.PartialSearchError as e:
+            self.partial = True
+            self.signals.error.emit(str(e))
+            return
+        except Exception as e:
+            if not self.cancelled and not expired():
+                self.signals.error.emit(str(e))
+                return
+        if expired() and not self.cancelled:
+            self.signals.error.emit(f"Search timed out after {minutes:g} minutes")
+            return
+        self.signals.finished.emit()
 
-            
-            time.sleep(5)  
 
-        log_message(f"[THREAD] All attempts failed for {file_id}", "Copernicus Connect", "CRITICAL")
+def create_download_worker(matches, client, query, selected_ids, out_dir, batch_id=None):
+    """Create the download worker for the engine chosen in the download settings."""
+    engine = create_download_engine(matches, client, query, selected_ids, out_dir, batch_id, DownloadWorkerSignals())
+    return DownloadWorker(engine)
 
 
 class UiForm(QMainWindow):
@@ -410,30 +390,7 @@ class UiForm(QMainWindow):
         """
         Returns (max_allowed, downloads_last_hour) for WEkEO download limit (500 per hour)
         """
-        import datetime
-        from pathlib import Path
-        pathfile = Path.home() / ".hda_download_status"
-        now = datetime.datetime.now()
-        one_hour_ago = now - datetime.timedelta(hours=1)
-        downloads_last_hour = 0
-        if pathfile.is_file():
-            try:
-                with open(pathfile, 'r') as f:
-                    for line in f:
-                        parts = line.strip().split()
-                        if len(parts) == 2:
-                            ts_str, count_str = parts
-                            try:
-                                ts = datetime.datetime.fromisoformat(ts_str)
-                                count = int(count_str)
-                                if ts > one_hour_ago:
-                                    downloads_last_hour += count
-                            except Exception:
-                                continue
-            except Exception:
-                pass
-        max_allowed = max(0, 500 - downloads_last_hour)
-        return max_allowed, downloads_last_hour
+        return quota.downloads_left()
     def __init__(self, client, parent=None):
         super().__init__(parent)
         uic.loadUi(UI_PATH, self)
@@ -470,8 +427,13 @@ class UiForm(QMainWindow):
         self.matches = []
         self.layer_data = []
         self.wms_layers = {}  
+        self.download_concurrency = None
         self.model = QStringListModel()
         self.treeViewWMS.setModel(self.model)
+        self.results_model = ResultsModel(format_size, self)
+        self.fileListView.setModel(self.results_model)
+        self.fileListView.setUniformItemSizes(True)
+        self.fileListView.selectionModel().selectionChanged.connect(self.results_model.update_selection)
 
         self.centralwidget.layout().setContentsMargins(10, 10, 10, 10)
 
@@ -496,6 +458,8 @@ class UiForm(QMainWindow):
         self.actionUser.triggered.connect(self.show_user_settings)
         self.actionPaths.triggered.connect(self.show_path_settings)
         self.actionLimit.triggered.connect(self.open_limit_dialog)
+        self.actionDownloadSettings.triggered.connect(self.open_download_dialog)
+        self.actionSearchSettings.triggered.connect(self.open_search_dialog)
         self.actionTerms.triggered.connect(self.open_terms_dialog)
         self.actionWiki.triggered.connect(self.open_wiki_page)
         self.load_datasetsButton.clicked.connect(self.load_datasets)
@@ -513,6 +477,12 @@ class UiForm(QMainWindow):
         self.btn_download_location.clicked.connect(self.show_path_settings)
         self.btn_open_file_location.clicked.connect(self.open_file_location)
         self.cancelButton.clicked.connect(self.cancel_download)
+        self.search_worker = None
+        self.cancelSearchButton.setIcon(self.style().standardIcon(QStyle.SP_DialogCancelButton))
+        self.cancelSearchButton.setEnabled(False)
+        self.cancelSearchButton.clicked.connect(self.cancel_search)
+        self.apply_bandwidth_settings()
+        self.spinBandwidth.valueChanged.connect(self.set_bandwidth_limit)
 
         self.limitLineEdit.setValidator(QIntValidator(0, 999999))
 
@@ -810,26 +780,22 @@ class UiForm(QMainWindow):
     
     def select_all_items(self):
         max_allowed, downloads_last_hour = self.get_max_downloads_left()
-        count = self.fileListWidget.count()
+        count = self.results_model.rowCount()
+        self.fileListView.selectAll()
         if count > max_allowed:
-            QMessageBox.warning(
+            QMessageBox.information(
                 self,
-                "Too many files",
-                f"WEkEO only supports 500 downloads per hour. Only the first {max_allowed} files will be selected. You have already downloaded {downloads_last_hour} files in the last hour."
+                "Download quota",
+                f"WEkEO only supports 500 downloads per hour and you have already downloaded {downloads_last_hour} files in the last hour. "
+                f"{max_allowed} files can start right away; the rest will start as the quota frees up."
             )
-            self.fileListWidget.clearSelection()
-            for i in range(max_allowed):
-                item = self.fileListWidget.item(i)
-                item.setSelected(True)
-        else:
-            self.fileListWidget.selectAll()
 
     def clear_selection(self):
-        self.fileListWidget.clearSelection()
+        self.fileListView.clearSelection()
 
     def select_interval(self):
         """
-        Select a range of files in fileListWidget based on txtFrom and txtTo.
+        Select a range of files in fileListView based on txtFrom and txtTo.
         txtFrom and txtTo should be 1-based indices (first file = 1).
         """
         try:
@@ -840,29 +806,63 @@ class UiForm(QMainWindow):
                 return
             from_idx = int(from_text) - 1
             to_idx = int(to_text) - 1
-            count = self.fileListWidget.count()
+            count = self.results_model.rowCount()
             if from_idx < 0 or to_idx < 0 or from_idx >= count or to_idx >= count:
                 QMessageBox.warning(self, "Invalid interval", f"Interval must be between 1 and {count}.")
                 return
             if from_idx > to_idx:
                 from_idx, to_idx = to_idx, from_idx
 
-            max_allowed, downloads_last_hour = self.get_max_downloads_left()
-            interval_size = to_idx - from_idx + 1
-            if interval_size > max_allowed:
-                QMessageBox.warning(
-                    self,
-                    "Interval too large",
-                    f"It is not allowed to select more than {max_allowed} files at once. WEkEO only supports 500 downloads per hour. You have already downloaded {downloads_last_hour} files in the last hour."
-                )
-                return
-            self.fileListWidget.clearSelection()
-            for i in range(from_idx, to_idx + 1):
-                item = self.fileListWidget.item(i)
-                item.setSelected(True)
+            self.results_model.select_rows(self.fileListView.selectionModel(), range(from_idx, to_idx + 1))
         except Exception as e:
             QMessageBox.warning(self, "Interval selection error", f"An error occurred:\n{e}")
 
+    def set_download_status(self, msg):
+        self.download_status = msg
+        text = f"Status: {msg}"
+        if self.download_concurrency:
+            text += f" ({self.download_concurrency} parallel)"
+        stats = getattr(self, "download_transfer", None)
+        if stats and stats["bytes_done"]:
+            text += (
+                f"\n{format_rate(stats['current_bps'])} now, {format_rate(stats['average_bps'])} average, "
+                f"ETA {format_eta(stats['eta_seconds'])}"
+            )
+        self.statusLabel.setText(text)
+
+    def set_download_transfer(self, stats):
+        self.download_transfer = stats
+        if stats["bytes_total"]:
+            self.progressBar.setFormat(
+                f"%p% ({format_size(stats['bytes_done'])} of {format_size(stats['bytes_total'])})"
+            )
+        else:
+            self.progressBar.setFormat(f"%p% ({stats['files_done']} of {stats['files_total']} files)")
+        self.set_download_status(getattr(self, "download_status", "Downloading..."))
+
+    def set_download_concurrency(self, level):
+        self.download_concurrency = level
+        self.set_download_status(getattr(self, "download_status", "Downloading..."))
+
+    def apply_bandwidth_settings(self):
+        """Configure the shared bandwidth limiter from the saved download settings."""
+        settings = load_download_settings()
+        limit = int(settings["bandwidth_limit_mb"] or 0)
+        ratelimit.get_limiter().configure(limit * 1024 ** 2, settings["bandwidth_schedule"])
+        self.spinBandwidth.blockSignals(True)
+        self.spinBandwidth.setValue(limit)
+        self.spinBandwidth.blockSignals(False)
+
+    def set_bandwidth_limit(self, limit):
+        """Change the bandwidth cap live; running transfers adopt it immediately."""
+        ratelimit.get_limiter().set_cap(limit * 1024 ** 2)
+        settings = load_download_settings()
+        settings["bandwidth_limit_mb"] = limit
+        try:
+            save_download_settings(settings)
+        except OSError as e:
+            log_message(f"Could not save bandwidth limit: {e}", "Copernicus Connect", "WARNING")
+
     def cancel_download(self):
         if hasattr(self, "worker") and self.worker:
             self.worker.cancel()
@@ -870,19 +870,26 @@ class UiForm(QMainWindow):
             self.cancelButton.setEnabled(False)
 
     def download_finished(self):
-        completed = getattr(self.worker, "completed_downloads", 0) if self.worker else 0
-        started = getattr(self.worker, "started_downloads", 0) if self.worker else 0
+        engine = self.worker.engine if self.worker else None
+        completed = getattr(engine, "completed_downloads", 0)
+        started = getattr(engine, "started_downloads", 0)
         in_progress_or_failed = max(0, started - completed)
-        self.save_download_status(completed)
 
-        if self.worker and self.worker.cancelled:
+        if engine and engine.cancelled:
+            partial = ""
+            if engine.partial_downloads:
+                partial = (
+                    f" Partly downloaded: {engine.partial_downloads} "
+                    f"({engine.partial_bytes / 1024 ** 2:.1f} MB kept, resumed on the next download)."
+                )
             self.statusLabel.setText("Status: Download cancelled.")
             QMessageBox.information(
                 self,
                 "Cancelled",
-                f"Download was cancelled. Completed: {completed}. Started but not finished: {in_progress_or_failed}."
+                f"Download was cancelled. Completed: {completed}. Started but not finished: {in_progress_or_failed}.{partial}"
             )
             self.progressBar.setValue(0)
+            self.progressBar.setFormat("%p%")
             self.statusLabel.setText("Status: Ready")
         else:
             self.statusLabel.setText("Status: Download complete.")
@@ -901,7 +908,7 @@ class UiForm(QMainWindow):
             pixmap.load(image_placeholder)  
         else:
             try:
-                response = requests.get(url, timeout=2)
+                response = get_session().get(url, timeout=2)
                 if response.status_code == 200:
                     pixmap.loadFromData(response.content)
                 else:
@@ -956,11 +963,13 @@ class UiForm(QMainWindow):
         except Exception:
             self.widgets = {}
         self.query = None
-        self.results = []
-        self.match_results = []
-        self.fileListWidget.clear()
+        self.cancel_search()
+        self.search_worker = None
+        self.results_model.clear()
+        self.searchStatusLabel.clear()
         self.txt_info.clear()
         self.progressBar.setValue(0)
+        self.progressBar.setFormat("%p%")
         self.statusLabel.setText("Status: Ready")
   
         self.loadingOverlay.hide()
@@ -1049,7 +1058,7 @@ class UiForm(QMainWindow):
             self.datasets = response["content"]
 
         self.datasetComboBox.clear()
-        self.fileListWidget.clear()
+        self.results_model.clear()
         self.datasetComboBox.setEditable(True)
         self.dataset_metadata.clear()
         self.matches.clear()
@@ -1529,77 +1538,180 @@ class UiForm(QMainWindow):
             limit_val = 0
         return None if limit_val == 0 else limit_val
 
-    def _search_with_timeout(self, query, search_limit, seconds=None):
-        """Run client.search with a hard overall timeout.
+    def open_search_cache(self, settings):
+        """The search result cache of the search settings, or None when it is off or cannot be opened."""
+        if not settings["cache"]:
+            return None
+        try:
+            cache = search_cache.SearchCache(
+                ttl=float(settings["cache_ttl_minutes"]) * 60,
+                keep=float(settings["cache_keep_days"]) * 24 * 3600,
+            )
+            cache.prune()
+            return cache
+        except OSError as e:
+            log_message(f"Search cache not available: {e}", "Copernicus Connect", "WARNING")
+            return None
+
+    def start_search(self, query, search_limit, use_cache=True):
+        """Run `query` on a SearchWorker; every page is appended to the results list as it arrives.
 
-        This guards against cases where the HDA client retries/backoffs or polls
-        for too long despite per-request timeouts.
+        Results found in the search cache are listed at once; when they are
+        older than the cache TTL the search runs in the background and
+        replaces them only if the server's answer differs.
         """
-        if seconds is None:
-            try:
-                seconds = DEFAULT_CLIENT_TIMEOUT
-            except NameError:
-                seconds = 60
-        # IMPORTANT: Do NOT use a context manager here, since exiting a
-        # ThreadPoolExecutor context performs a blocking shutdown(wait=True).
-        # That would freeze the UI after a timeout. We manage shutdown manually.
-        ex = ThreadPoolExecutor(max_workers=1)
-        fut = ex.submit(self.client.search, query, search_limit)
-        timed_out = False
+        self.cancel_search()
+        settings = load_search_settings()
+        self.search_total = None
+        self.search_limit = search_limit
+        self.search_query = query
+        self.results_model.clear()
+
+        self.search_cache = self.open_search_cache(settings)
+        self.search_key = search_cache.query_key(query, search_limit)
+        entry = self.search_cache.get(self.search_key) if self.search_cache and use_cache else None
+        if entry is not None:
+            self._append_search_features(entry.features, entry.total)
+            fetched = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.fetched))
+            if self.search_cache.is_fresh(entry):
+                self.searchStatusLabel.setText(f"{self._results_summary()} (cached {fetched})")
+                return
+
+        worker = SearchWorker(self.client, query, search_limit, settings)
+        if entry is not None:
+            self.revalidated_features = []
+            self.revalidated_total = None
+            worker.signals.page.connect(lambda features, total: self.add_revalidation_page(worker, features, total))
+            worker.signals.finished.connect(lambda: self.revalidation_finished(worker))
+            worker.signals.error.connect(lambda message: self.revalidation_failed(worker, message))
+            self.searchStatusLabel.setText(f"{self._results_summary()} (cached {fetched}) 🔄 Checking for updates…")
+        else:
+            worker.signals.page.connect(lambda features, total: self.add_search_page(worker, features, total))
+            worker.signals.finished.connect(lambda: self.search_finished(worker))
+            worker.signals.error.connect(lambda message: self.search_failed(worker, message))
+            self.searchStatusLabel.setText("🔄 Searching…")
+        self.search_worker = worker
+        self.cancelSearchButton.setEnabled(True)
+        QThreadPool.globalInstance().start(worker)
+
+    def _append_search_features(self, features, total):
+        self.search_total = total
+        self.results_model.append(features)
+
+    def _results_summary(self):
+        count = self.results_model.rowCount()
+        message = f"Found {count} results. Size: {format_size(self.results_model.total_size)}"
+        if self.search_limit is not None and count >= self.search_limit:
+            message += f" Reached the limit of {self.search_limit}; there may be additional matches."
+        return message
+
+    def _store_search_results(self, features, total):
+        if self.search_cache is None:
+            return
         try:
-            return fut.result(timeout=seconds)
-        except FuturesTimeout:
-            timed_out = True
-            try:
-                fut.cancel()
-            except Exception:
-                pass
-            # Do not block the UI waiting for search to finish
-            try:
-                ex.shutdown(wait=False)
-            except Exception:
-                pass
-            raise TimeoutError(f"Search timed out after {seconds} seconds")
-        finally:
-            # If not timed out, we can shut down cleanly and wait for completion
-            if not timed_out:
-                try:
-                    ex.shutdown(wait=True)
-                except Exception:
-                    pass
+            self.search_cache.put(self.search_key, self.search_query, self.search_limit, features, total)
+        except (OSError, TypeError, ValueError) as e:
+            log_message(f"Could not cache the search results: {e}", "Copernicus Connect", "WARNING")
 
-    def _populate_results_ui(self, search_limit):
-        self.match_results = []
-        for match in self.results:
-            try:
-                feature = match.results[0]
-                self.match_results.append({
-                    "id": feature["id"],
-                    "match": match
-                })
-            except Exception as e:
-                log_message(f"Error handling match: {e}", "Copernicus Connect", "WARNING")
-
-        self.fileListWidget.clear()
-        for item in self.match_results:
-            feature_id = item["id"]
-            size = item["match"].results[0]["properties"].get("size")
-            if isinstance(size, int):
-                size = format_size(size)
-            label = f"{feature_id}\t{size})"
-            self.fileListWidget.addItem(label)
-
-        total_volume = getattr(self.results, "volume", None)
-        if isinstance(total_volume, int):
-            total_volume = format_size(total_volume)
-
-        message = f"Found {len(self.match_results)} results.\nSize: {total_volume}"
-        if search_limit is not None and len(self.match_results) >= search_limit:
-            message += (
-                f"\nThe number of matches has reached the limit of {search_limit}. "
-                "There may be additional matches."
+    def add_search_page(self, worker, features, total):
+        if worker is not self.search_worker:
+            return
+        self._append_search_features(features, total)
+
+        expected = total
+        if self.search_limit is not None:
+            expected = min(total, self.search_limit) if total is not None else self.search_limit
+        of_total = f" of {expected}" if expected is not None else ""
+        self.searchStatusLabel.setText(f"🔄 Found {self.results_model.rowCount()}{of_total} results…")
+
+    def search_finished(self, worker):
+        if worker is not self.search_worker:
+            return
+        self.search_worker = None
+        self.cancelSearchButton.setEnabled(False)
+
+        if worker.cancelled:
+            self.searchStatusLabel.setText(f"{self._results_summary()} Search cancelled.")
+            return
+        self._store_search_results(self.results_model.all_features(), self.search_total)
+        self.searchStatusLabel.setText(self._results_summary())
+
+    def add_revalidation_page(self, worker, features, total):
+        if worker is not self.search_worker:
+            return
+        self.revalidated_features.extend(features)
+        self.revalidated_total = total
+
+    def revalidation_finished(self, worker):
+        if worker is not self.search_worker:
+            return
+        self.search_worker = None
+        self.cancelSearchButton.setEnabled(False)
+        if worker.cancelled:
+            self.searchStatusLabel.setText(f"{self._results_summary()} (cached, not checked for updates)")
+            return
+
+        features = self.revalidated_features
+        total = self.revalidated_total
+        self._store_search_results(features, total)
+        if [feature.get("id") for feature in features] == self.results_model.ids:
+            self.searchStatusLabel.setText(f"{self._results_summary()} (up to date)")
+            return
+
+        # Replace the cached results, keeping the selection of products still found
+        selected_ids = self.results_model.selected_ids()
+        self.results_model.clear()
+        self._append_search_features(features, total)
+        rows = [self.results_model.row_of(feature_id) for feature_id in selected_ids]
+        self.results_model.select_rows(self.fileListView.selectionModel(), [row for row in rows if row is not None])
+        self.searchStatusLabel.setText(f"{self._results_summary()} (updated from the server)")
+
+    def revalidation_failed(self, worker, err_text):
+        if worker is not self.search_worker:
+            return
+        self.search_worker = None
+        self.cancelSearchButton.setEnabled(False)
+        log_message(f"Could not check cached search results: {err_text}", "Copernicus Connect", "WARNING")
+        self.searchStatusLabel.setText(f"{self._results_summary()} (cached, could not check for updates)")
+
+    def search_failed(self, worker, err_text):
+        if worker is not self.search_worker:
+            return
+        self.search_worker = None
+        self.cancelSearchButton.setEnabled(False)
+        if worker.partial:
+            # The results of the tiles that worked are listed and can be downloaded
+            log_message(f"Search incomplete: {err_text}", "Copernicus Connect", "WARNING")
+            self.searchStatusLabel.setText(f"{self._results_summary()} Some search tiles failed.")
+            QMessageBox.warning(self, "Search incomplete", err_text)
+            return
+        self.searchStatusLabel.setText(f"Search failed after {self.results_model.rowCount()} results.")
+        log_message(f"Error during search: {err_text}", "Copernicus Connect", "ERROR")
+
+        # Specific handling for timeouts: offer Retry/Cancel
+        if "timed out" in err_text.lower():
+            choice = QMessageBox.question(
+                self,
+                "Search timed out",
+                f"The search did not finish within the time limit.\n\n{err_text}\n\nDo you want to try again?",
+                QMessageBox.Retry | QMessageBox.Cancel,
+                QMessageBox.Retry,
             )
-        QMessageBox.information(self, "Search complete", message)
+            if choice == QMessageBox.Retry:
+                # Re-run with the same query; terms were already checked in this flow.
+                self.start_search(worker.query, worker.limit, use_cache=False)
+            return
+
+        QMessageBox.critical(self, "Search error", err_text)
+
+    def cancel_search(self):
+        """Stop the running search after its current page. The results so far stay in the list."""
+        worker = getattr(self, "search_worker", None)
+        if worker is None:
+            return
+        worker.cancel()
+        self.cancelSearchButton.setEnabled(False)
+        self.searchStatusLabel.setText("Cancelling search…")
 
     def send_query(self, query):
         """Public helper: run a provided query dict without UI validation."""
@@ -1651,12 +1763,8 @@ class UiForm(QMainWindow):
             if not self.query:
                 return
 
-            # 6) Execute search (with hard timeout)
-            search_limit = self._parse_search_limit()
-            self.results = self._search_with_timeout(self.query, search_limit)
-
-            # 7) Populate results in UI
-            self._populate_results_ui(search_limit)
+            # 6) Search in the background; pages are listed as they arrive
+            self.start_search(self.query, self._parse_search_limit())
 
         except Exception as e:
             # Ensure overlay is hidden before showing any dialogs
@@ -1664,23 +1772,7 @@ class UiForm(QMainWindow):
 
             err_text = str(e)
             log_message(f"Error during search: {err_text}", "Copernicus Connect", "ERROR")
-
-            # Specific handling for timeouts: offer Retry/Cancel
-            if isinstance(e, TimeoutError) or "timed out" in err_text.lower():
-                choice = QMessageBox.question(
-                    self,
-                    "Search timed out",
-                    f"The search did not finish within the time limit.\n\n{err_text}\n\nDo you want to try again?",
-                    QMessageBox.Retry | QMessageBox.Cancel,
-                    QMessageBox.Retry,
-                )
-                if choice == QMessageBox.Retry:
-                    # Re-run with the same query; skip UI validation since it's already built
-                    # and terms were already checked in this flow.
-                    return self.request_data(query=self.query if query is None else query, skip_validation=True)
-                return
-
-            # Default error dialog for non-timeout errors
+            # Search errors, timeouts included, are reported by search_failed
             QMessageBox.critical(self, "Search error", err_text)
         finally:
             # Keep as a safety; already hidden above on error
@@ -1750,6 +1842,17 @@ class UiForm(QMainWindow):
         if exec_dialog(dialog):
             QMessageBox.information(self, "Limit Saved", "New search limit has been saved.")
 
+    def open_download_dialog(self):
+        dialog = DownloadDialog(self)
+        if exec_dialog(dialog):
+            self.apply_bandwidth_settings()
+            QMessageBox.information(self, "Settings Saved", "New download settings will be used for the next download.")
+
+    def open_search_dialog(self):
+        dialog = SearchDialog(self)
+        if exec_dialog(dialog):
+            QMessageBox.information(self, "Settings Saved", "New search settings will be used for the next search.")
+
     def check_term(self, term):
         try:
             response = self.client.get("termsaccepted")
@@ -1773,66 +1876,41 @@ class UiForm(QMainWindow):
                 pass
             return None
         
-    def save_download_status(self, download_count):
-        """
-        Save the count and timestamp of downloads to a file, keeping only entries from the last hour.
-        Each line: <timestamp_iso> <count>
-        """
-        import datetime
-        pathfile = Path.home() / ".hda_download_status"
-        now = datetime.datetime.now()
-        one_hour_ago = now - datetime.timedelta(hours=1)
-        entries = []
-        # Read existing entries
-        if pathfile.is_file():
-            try:
-                with open(pathfile, 'r') as f:
-                    for line in f:
-                        parts = line.strip().split()
-                        if len(parts) == 2:
-                            ts_str, count_str = parts
-                            try:
-                                ts = datetime.datetime.fromisoformat(ts_str)
-                                count = int(count_str)
-                                if ts > one_hour_ago:
-                                    entries.append((ts, count))
-                            except Exception:
-                                continue
-            except Exception as e:
-                log_message(f"Could not read download status: {e}", "Copernicus Connect", "WARNING")
-        # Add new entry
-        entries.append((now, int(download_count)))
-        # Write back only entries within last hour
-        try:
-            with open(pathfile, 'w') as f:
-                for ts, count in entries:
-                    f.write(f"{ts.isoformat()} {count}\n")
-        except Exception as e:
-            log_message(f"Could not save download status: {e}", "Copernicus Connect", "WARNING")
-
-
     def download_selected_files(self):
 
-        if not hasattr(self, "match_results") or not self.match_results:
-            log_message("match_results is empty!", "Copernicus Connect", "ERROR")
+        if not self.results_model.rowCount():
+            log_message("No search results to download!", "Copernicus Connect", "ERROR")
             QMessageBox.warning(self, "No data", "You must perform a search before downloading.")
             return
 
-        selected_items = self.fileListWidget.selectedItems()
-        selected_ids = [item.text().split()[0] for item in selected_items]
-
-        if not selected_ids:
+        features = self.results_model.selected_features()
+        if not features:
             QMessageBox.information(self, "No selection", "Please select at least one file to download.")
             return
 
+        # Only the selected products are handed to the download engine
+        matches = SearchResults(self.client, features, self.search_query.get("dataset_id"))
+        self.start_download(matches, self.query, {feature["id"] for feature in features})
+
+    def start_download(self, matches, query, selected_ids, batch_id=None):
+        """Start a DownloadWorker for `selected_ids` out of `matches`.
+
+        `batch_id` continues a batch recorded in the download journal.
+        """
         max_allowed, downloads_last_hour = self.get_max_downloads_left()
         if len(selected_ids) > max_allowed:
-            QMessageBox.warning(
+            eta = quota.QuotaScheduler().eta(len(selected_ids))
+            choice = QMessageBox.question(
                 self,
-                "Download limit exceeded",
-                f"You can only download {max_allowed} more files right now. WEkEO only supports 500 downloads per hour. You have already downloaded {downloads_last_hour} files in the last hour."
+                "Download quota",
+                f"WEkEO only supports 500 downloads per hour and you have already downloaded {downloads_last_hour} files in the last hour.\n\n"
+                f"{max_allowed} of the {len(selected_ids)} files can start right away. The rest will start as the quota frees up; "
+                f"the last file starts around {eta:%H:%M} and the batch is done once it has been transferred.\n\nDo you want to continue?",
+                QMessageBox.Ok | QMessageBox.Cancel,
+                QMessageBox.Ok,
             )
-            return
+            if choice != QMessageBox.Ok:
+                return
 
         out_dir = self.get_download_path()
         try:
@@ -1844,20 +1922,63 @@ class UiForm(QMainWindow):
         
         
         self.progressBar.setValue(0)
+        self.progressBar.setFormat("%p%")
         self.statusLabel.setText("Status: Starting download...")
 
         
 
         try:
-            self.worker = DownloadWorker(self.results, self.client, self.query, selected_ids, out_dir)
+            self.worker = create_download_worker(matches, self.client, query, selected_ids, out_dir, batch_id)
             self.worker.signals.progress.connect(self.progressBar.setValue)
-            self.worker.signals.status.connect(lambda msg: self.statusLabel.setText(f"Status: {msg}"))
+            self.worker.signals.transfer.connect(self.set_download_transfer)
+            self.download_transfer = None
+            self.download_concurrency = None
+            self.worker.signals.status.connect(self.set_download_status)
+            self.worker.signals.concurrency.connect(self.set_download_concurrency)
             self.worker.signals.error.connect(lambda err: QMessageBox.warning(self, "Error", err))
             self.worker.signals.finished.connect(self.download_finished)     # type: ignore 
 
             QThreadPool.globalInstance().start(self.worker)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Download failed:\n{e}")
+
+    def offer_journal_resume(self):
+        """Offer to resume unfinished batches found in the download journal."""
+        out_dir = self.get_download_path()
+        if not os.path.isfile(os.path.join(str(out_dir), journal.JOURNAL_FILENAME)):
+            return
+        try:
+            download_journal = journal.DownloadJournal(out_dir)
+            batches = download_journal.unfinished_batches()
+        except Exception as e:
+            log_message(f"Could not read download journal: {e}", "Copernicus Connect", "WARNING")
+            return
+
+        try:
+            for batch in batches:
+                remaining_bytes = format_size(batch["remaining_bytes"]) if batch["remaining_bytes"] else "unknown size"
+                choice = QMessageBox.question(
+                    self,
+                    "Resume download",
+                    f"An unfinished download from {batch['created']} was found.\n\n"
+                    f"Dataset: {batch['dataset_id']}\n"
+                    f"{batch['remaining']} of {batch['total']} products left ({remaining_bytes}).\n\n"
+                    "Do you want to resume it now?",
+                    QMessageBox.Yes | QMessageBox.No,
+                    QMessageBox.Yes,
+                )
+                if choice != QMessageBox.Yes:
+                    download_journal.dismiss_batch(batch["batch_id"])
+                    continue
+
+                features = download_journal.batch_features(batch["batch_id"])
+                matches = SearchResults(self.client, features, batch["dataset_id"])
+                selected_ids = [feature["id"] for feature in features]
+                self.start_download(matches, batch["query"], selected_ids, batch["batch_id"])
+                # One batch at a time; the others are offered next time
+                break
+        finally:
+            download_journal.close()
                
 
 def get_user_credentials(parent=None):
@@ -1961,6 +2082,13 @@ def launch_form(parent=None):
         except Exception:
             pass
 
+    # Offer to continue downloads interrupted by a crash or a closed dock
+    if logged_in:
+        try:
+            form.offer_journal_resume()
+        except Exception as e:
+            log_message(f"Could not resume downloads: {e}", "Copernicus Connect", "WARNING")
+
     # If we created an app just for a quick test run and want to show the window when
     # running outside QGIS, you can (optionally) show it here:
     if app_created and not running_in_qgis:
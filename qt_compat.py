@@ -3,12 +3,16 @@
 try:
     from qgis.PyQt import uic
     from qgis.PyQt.QtCore import (
+        QAbstractListModel,
+        QItemSelection,
+        QItemSelectionModel,
         QModelIndex,
         QObject,
         QRunnable,
         QSize,
         QStringListModel,
         QThreadPool,
+        QTime,
         QTimer,
         QDateTime,
         Qt,
@@ -41,6 +45,7 @@ try:
         QHBoxLayout,
         QLabel,
         QLineEdit,
+        QListView,
         QListWidget,
         QListWidgetItem,
         QMainWindow,
@@ -57,12 +62,16 @@ try:
 except ImportError:
     from PyQt5 import uic
     from PyQt5.QtCore import (
+        QAbstractListModel,
+        QItemSelection,
+        QItemSelectionModel,
         QModelIndex,
         QObject,
         QRunnable,
         QSize,
         QStringListModel,
         QThreadPool,
+        QTime,
         QTimer,
         QDateTime,
         Qt,
@@ -95,6 +104,7 @@ except ImportError:
         QHBoxLayout,
         QLabel,
         QLineEdit,
+        QListView,
         QListWidget,
         QListWidgetItem,
         QMainWindow,
@@ -160,7 +170,7 @@ for _name in ("Ok", "Cancel", "Save", "Close"):
 for _name in ("AcceptRole", "ActionRole", "RejectRole"):
     _alias_enum(QDialogButtonBox, _name, "ButtonRole")
 
-for _name in ("Cancel", "Close", "Ok", "Retry"):
+for _name in ("Cancel", "Close", "No", "Ok", "Retry", "Yes"):
     _alias_enum(QMessageBox, _name, "StandardButton")
 
 for _name in ("Critical", "Information", "Question", "Warning"):
@@ -177,6 +187,7 @@ _alias_qt("AlignCenter", "AlignmentFlag")
 _alias_qt("AlignLeft", "AlignmentFlag")
 _alias_qt("AlignRight", "AlignmentFlag")
 _alias_qt("BottomDockWidgetArea", "DockWidgetArea")
+_alias_qt("DisplayRole", "ItemDataRole")
 _alias_qt("ItemIsEnabled", "ItemFlag")
 _alias_qt("KeepAspectRatio", "AspectRatioMode")
 _alias_qt("LeftDockWidgetArea", "DockWidgetArea")
@@ -184,12 +195,15 @@ _alias_qt("RichText", "TextFormat")
 _alias_qt("RightDockWidgetArea", "DockWidgetArea")
 _alias_qt("SmoothTransformation", "TransformationMode")
 _alias_qt("SolidPattern", "BrushStyle")
+_alias_qt("ToolTipRole", "ItemDataRole")
 _alias_qt("TopDockWidgetArea", "DockWidgetArea")
 _alias_qt("UserRole", "ItemDataRole")
 _alias_qt("WA_StyledBackground", "WidgetAttribute")
 
 _alias_enum(QAbstractItemView, "NoEditTriggers", "EditTrigger")
 _alias_enum(QAbstractItemView, "MultiSelection", "SelectionMode")
+_alias_enum(QItemSelectionModel, "Select", "SelectionFlag")
+_alias_enum(QItemSelectionModel, "ClearAndSelect", "SelectionFlag")
 _alias_value(QListWidget, "MultiSelection", getattr(QAbstractItemView, "MultiSelection", None))
 
 
@@ -0,0 +1,179 @@
+"""List model of search results for very large result sets.
+
+A QListWidget keeps one item object with a formatted string per match,
+and ids had to be parsed back out of the item text. ResultsModel keeps
+the results in columns instead: ids in a list, sizes and dates in typed
+arrays, an id -> row dict for lookups and a bytearray of selected rows.
+Labels are only formatted for the rows the view shows. The full feature
+dicts are not kept: the few properties a download needs are, and
+feature() builds a feature of them for the rows that are downloaded.
+"""
+
+import datetime
+import itertools
+from array import array
+
+try:
+    from .qt_compat import QAbstractListModel, QItemSelection, QItemSelectionModel, QModelIndex, Qt
+except ImportError:
+    from qt_compat import QAbstractListModel, QItemSelection, QItemSelectionModel, QModelIndex, Qt
+
+# Feature properties that hold the acquisition date, in order of preference
+DATE_PROPERTIES = ("startdate", "start", "datetime", "date")
+# Feature properties besides location and size that downloads use (checksums)
+DOWNLOAD_PROPERTIES = ("checksum", "sha256", "md5")
+
+UNKNOWN_SIZE = -1
+UNKNOWN_DATE = float("nan")
+
+
+def feature_date(properties):
+    """Acquisition time of a feature as a UTC timestamp, or NaN."""
+    for key in DATE_PROPERTIES:
+        value = properties.get(key)
+        if not isinstance(value, str):
+            continue
+        try:
+            parsed = datetime.datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            continue
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return parsed.timestamp()
+    return UNKNOWN_DATE
+
+
+class ResultsModel(QAbstractListModel):
+    def __init__(self, format_size=str, parent=None):
+        super().__init__(parent)
+        self.format_size = format_size
+        self._clear()
+
+    def _clear(self):
+        self.ids = []
+        self.sizes = array("q")
+        self.dates = array("d")
+        self.locations = []
+        # row -> {property: value} of DOWNLOAD_PROPERTIES, only for rows that have any
+        self.extra = {}
+        self.rows = {}
+        self.selected = bytearray()
+        self.total_size = 0
+
+    # Qt model interface
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.ids)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self.ids):
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return self.label(row)
+        if role == Qt.ToolTipRole:
+            date = self.dates[row]
+            if date != date:
+                return self.ids[row]
+            when = datetime.datetime.fromtimestamp(date, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+            return f"{self.ids[row]}\n{when}"
+        if role == Qt.UserRole:
+            return self.ids[row]
+        return None
+
+    def label(self, row):
+        size = self.sizes[row]
+        size = self.format_size(size) if size != UNKNOWN_SIZE else None
+        return f"{self.ids[row]}\t{size})"
+
+    # Results
+
+    def append(self, features):
+        """Append search features, skipping ids already listed. Returns the number added."""
+        new = []
+        ids = set()
+        for feature in features:
+            feature_id = feature.get("id")
+            if feature_id is None or feature_id in self.rows or feature_id in ids:
+                continue
+            ids.add(feature_id)
+            new.append(feature)
+        if not new:
+            return 0
+        first = len(self.ids)
+        self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+        for row, feature in enumerate(new, first):
+            properties = feature.get("properties") or {}
+            size = properties.get("size")
+            size = size if isinstance(size, int) and size >= 0 else UNKNOWN_SIZE
+            self.ids.append(feature["id"])
+            self.sizes.append(size)
+            self.dates.append(feature_date(properties))
+            self.locations.append(properties.get("location"))
+            extra = {key: properties[key] for key in DOWNLOAD_PROPERTIES if key in properties}
+            if extra:
+                self.extra[row] = extra
+            self.rows[feature["id"]] = row
+            if size != UNKNOWN_SIZE:
+                self.total_size += size
+        self.selected.extend(bytes(len(new)))
+        self.endInsertRows()
+        return len(new)
+
+    def clear(self):
+        self.beginResetModel()
+        self._clear()
+        self.endResetModel()
+
+    def row_of(self, feature_id):
+        """Row of a product id, or None."""
+        return self.rows.get(feature_id)
+
+    def feature(self, row):
+        """A search feature of `row` with the properties a download needs."""
+        properties = dict(self.extra.get(row, ()))
+        if self.locations[row] is not None:
+            properties["location"] = self.locations[row]
+        if self.sizes[row] != UNKNOWN_SIZE:
+            properties["size"] = self.sizes[row]
+        return {"id": self.ids[row], "properties": properties}
+
+    def all_features(self):
+        return [self.feature(row) for row in range(len(self.ids))]
+
+    # Selection
+
+    def update_selection(self, selected, deselected):
+        """Slot for QItemSelectionModel.selectionChanged: mirror the view's selection in the bitmap."""
+        for selection, flag in ((deselected, 0), (selected, 1)):
+            for item_range in selection:
+                top, bottom = item_range.top(), item_range.bottom()
+                self.selected[top:bottom + 1] = bytes([flag]) * (bottom - top + 1)
+
+    def selected_count(self):
+        return self.selected.count(1)
+
+    def selected_ids(self):
+        """Ids of the selected rows, in result order."""
+        return list(itertools.compress(self.ids, self.selected))
+
+    def selected_features(self):
+        return [self.feature(row) for row in itertools.compress(range(len(self.ids)), self.selected)]
+
+    def selection_for_rows(self, rows):
+        """A QItemSelection of `rows`, one range per run of consecutive rows."""
+        selection = QItemSelection()
+        rows = sorted(rows)
+        start = previous = None
+        for row in rows + [None]:
+            if start is not None and (row is None or row != previous + 1):
+                selection.select(self.index(start), self.index(previous))
+                start = None
+            if row is not None and start is None:
+                start = row
+            previous = row
+        return selection
+
+    def select_rows(self, selection_model, rows):
+        """Select exactly `rows` in the view of `selection_model`."""
+        selection_model.select(self.selection_for_rows(rows), QItemSelectionModel.ClearAndSelect)
@@ -0,0 +1,142 @@
+"""On-disk cache of search results.
+
+Results are kept per query under a hash of its canonical form: keys
+sorted, empty values and paging parameters dropped, datetimes in UTC with
+one format, bounding boxes rounded and multi-select values sorted. Two
+queries that differ only in such details share their results.
+
+Every entry is a gzipped JSON file with the features and the time they
+were fetched. An entry younger than the TTL is used as is; an older one
+is still shown at once but fetched again in the background. Entries
+older than the keep time are removed.
+"""
+
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path.home() / ".hda_search_cache"
+
+# Decimal places kept of bounding box coordinates (about 10 m)
+BBOX_DECIMALS = 4
+# Paging is chosen by the search, not part of what is searched for
+_PAGING_KEYS = {"startIndex", "itemsPerPage"}
+_DATETIME_RE = re.compile(r"^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}:?\d{2})?$")
+
+
+def normalize_datetime(text):
+    """The UTC "YYYY-MM-DDTHH:MM:SS.mmmZ" form of an ISO date or datetime, or `text` unchanged."""
+    if not _DATETIME_RE.match(text):
+        return text
+    try:
+        value = datetime.datetime.fromisoformat(text.replace("Z", "+00:00").replace(" ", "T"))
+    except ValueError:
+        return text
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}Z"
+
+
+def _canonical(value, key=None):
+    if isinstance(value, dict):
+        return {
+            name: _canonical(item, name)
+            for name, item in sorted(value.items())
+            if item not in (None, "", [], {}) and name not in _PAGING_KEYS
+        }
+    if isinstance(value, (list, tuple)):
+        if key == "bbox":
+            return [round(float(item), BBOX_DECIMALS) for item in value]
+        items = [_canonical(item) for item in value]
+        if all(isinstance(item, str) for item in items):
+            items = sorted(items)
+        return items
+    if isinstance(value, str):
+        return normalize_datetime(value.strip())
+    return value
+
+
+def canonical_query(query, limit=None):
+    """The canonical JSON text of a query and result limit."""
+    return json.dumps({"query": _canonical(dict(query)), "limit": limit}, sort_keys=True, separators=(",", ":"))
+
+
+def query_key(query, limit=None):
+    return hashlib.sha256(canonical_query(query, limit).encode("utf-8")).hexdigest()
+
+
+class CacheEntry:
+    def __init__(self, features, total, fetched):
+        self.features = features
+        self.total = total
+        # time.time() of the search
+        self.fetched = fetched
+
+    def age(self):
+        return max(0.0, time.time() - self.fetched)
+
+
+class SearchCache:
+    def __init__(self, root=None, ttl=3600, keep=7 * 24 * 3600):
+        """Cache in `root`; entries are fresh for `ttl` and kept for `keep` seconds."""
+        self.root = Path(root) if root else DEFAULT_CACHE_PATH
+        self.ttl = ttl
+        self.keep = keep
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key):
+        return self.root / f"{key}.json.gz"
+
+    def get(self, key):
+        """The entry stored under `key`, or None when there is none or it is past the keep time."""
+        path = self.path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            entry = CacheEntry(data["features"], data.get("total"), float(data["fetched"]))
+        except (OSError, ValueError, KeyError, TypeError, EOFError):
+            return None
+        if entry.age() > self.keep:
+            self.remove(key)
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        return entry.age() <= self.ttl
+
+    def put(self, key, query, limit, features, total):
+        data = {
+            "query": json.loads(canonical_query(query, limit)),
+            "fetched": time.time(),
+            "total": total,
+            "features": features,
+        }
+        path = self.path(key)
+        temporary = path.with_name(path.name + ".part")
+        with gzip.open(temporary, "wt", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temporary, path)
+
+    def remove(self, key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def prune(self):
+        """Remove entries past the keep time. Returns the number removed."""
+        removed = 0
+        cutoff = time.time() - self.keep
+        for path in self.root.glob("*.json.gz"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                pass
+        return removed
@@ -0,0 +1,150 @@
+"""Page by page HDA search.
+
+hda's Client.search collects every page of a search before it returns,
+which for a query with thousands of matches takes minutes. search_pages
+requests the same pages from dataaccess/search itself and yields each one
+as soon as it arrives, so results can be shown and selected while the
+rest are still coming in, and the search can stop between two pages.
+
+Once the first page has announced the total number of results, the other
+pages are fetched several at a time. They are still yielded in server
+order, and a product that shows up on two pages is yielded only once.
+"""
+
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from hda.utils import convert
+
+SEARCH_ACTION = "dataaccess/search"
+ITEMS_PER_PAGE = 100
+
+
+def prepare_query(client, query):
+    """Convert a v1 query as hda's search does and accept the dataset's terms."""
+    query = convert(dict(query))
+    if not query.get("dataset_id"):
+        raise ValueError("Missing dataset_id, check your query")
+    client.accept_tac(query["dataset_id"])
+    return query
+
+
+def page_total(page):
+    """Total number of matches announced by a page, or None when unknown."""
+    total = (page.get("properties") or {}).get("totalResults")
+    return total if isinstance(total, int) else None
+
+
+def fetch_page(client, query, start_index, items_per_page=ITEMS_PER_PAGE):
+    request = dict(query, startIndex=start_index, itemsPerPage=items_per_page)
+    return client.post(request, SEARCH_ACTION)
+
+
+def _sequential_pages(client, query, first, items_per_page, cancelled):
+    """Follow the pages after `first` one by one, by nextIndex or startIndex."""
+    page = first
+    while True:
+        properties = page.get("properties") or {}
+        total = page_total(page)
+        if total is None:
+            start_index = properties.get("nextIndex")
+            if not start_index:
+                return
+        else:
+            start_index = properties.get("startIndex", 0) + items_per_page
+            if start_index >= total:
+                return
+        if cancelled():
+            return
+        page = fetch_page(client, query, start_index, items_per_page)
+        if not page.get("features"):
+            return
+        yield page
+
+
+def _parallel_pages(client, query, end, items_per_page, parallel, cancelled):
+    """Fetch the pages from items_per_page up to `end` with at most `parallel` requests at a time.
+
+    Pages are yielded in server order; a page that arrives early waits for
+    the ones before it.
+    """
+    starts = iter(range(items_per_page, end, items_per_page))
+    executor = ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="search-page")
+    pending = []
+    try:
+        while True:
+            while len(pending) < parallel and not cancelled():
+                start_index = next(starts, None)
+                if start_index is None:
+                    break
+                pending.append(executor.submit(fetch_page, client, query, start_index, items_per_page))
+            if not pending or cancelled():
+                return
+            yield pending.pop(0).result()
+    finally:
+        for future in pending:
+            future.cancel()
+        # Do not wait for requests still running after a cancel or an error
+        executor.shutdown(wait=False)
+
+
+def search_pages(client, query, limit=None, items_per_page=ITEMS_PER_PAGE, parallel=1, cancelled=lambda: False,
+                 prepare=True):
+    """Yield (features, total) for every page of a search.
+
+    `total` is the number of matches announced by the server, or None when
+    it does not tell (then the next index is followed, one page at a
+    time). With `parallel` > 1 and a known total, up to `parallel` pages
+    are requested at once. Features already yielded on an earlier page are
+    dropped. At most `limit` features are yielded in all. Stops between
+    two pages once `cancelled()` returns True. A query that went through
+    prepare_query already can be passed with `prepare` False.
+    """
+    if prepare:
+        query = prepare_query(client, query)
+    if cancelled():
+        return
+    first = fetch_page(client, query, 0, items_per_page)
+    total = page_total(first)
+    if parallel > 1 and total is not None:
+        end = total if limit is None else min(total, limit)
+        rest = _parallel_pages(client, query, end, items_per_page, parallel, cancelled)
+    else:
+        rest = _sequential_pages(client, query, first, items_per_page, cancelled)
+
+    pages = ((page.get("features") or [], total) for page in itertools.chain([first], rest))
+    try:
+        yield from unique_features(pages, limit, cancelled)
+    finally:
+        rest.close()
+
+
+def unique_features(pages, limit=None, cancelled=lambda: False):
+    """Yield the (features, total) of `pages` with every product once.
+
+    Features already yielded on an earlier page are dropped and at most
+    `limit` features are yielded in all. Stops after a page once
+    `cancelled()` returns True; `pages` is closed when it stops early.
+    """
+    seen = set()
+    returned = 0
+    try:
+        for page, total in pages:
+            features = []
+            for feature in page:
+                feature_id = feature.get("id")
+                if feature_id in seen:
+                    continue
+                seen.add(feature_id)
+                features.append(feature)
+            if limit is not None:
+                features = features[:max(0, limit - returned)]
+            returned += len(features)
+            if features:
+                yield features, total
+            if (limit is not None and returned >= limit) or cancelled():
+                return
+    finally:
+        close = getattr(pages, "close", None)
+        if close is not None:
+            close()
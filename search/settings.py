@@ -0,0 +1,52 @@
+import json
+from pathlib import Path
+
+CONFIG_PATH = Path.home() / ".hda_search_settings"
+
+DEFAULT_SETTINGS = {
+    # Results requested per page, and pages fetched in parallel once the
+    # first page has told how many results there are (1 = one after another)
+    "page_size": 100,
+    "page_parallel": 4,
+    # Overall time limit of a search in minutes (0 = none); each request
+    # is also limited by the client timeout
+    "timeout_minutes": 10,
+    # Split date ranges longer than shard_days into windows of that length,
+    # searched shard_parallel at a time (0 = one search over the whole
+    # range). A window that times out is halved, down to shard_min_hours.
+    "shard_days": 180,
+    "shard_parallel": 4,
+    "shard_min_hours": 24,
+    # Opt-in: split a bounding box with more than tile_target matches into
+    # quarters, again and again down to tile_min_degrees, and search the
+    # tiles tile_parallel at a time
+    "tiles": False,
+    "tile_target": 2000,
+    "tile_min_degrees": 0.5,
+    "tile_parallel": 4,
+    # Keep results on disk per query. Results younger than cache_ttl_minutes
+    # are shown without asking the server; older ones are shown at once and
+    # searched again in the background. Entries go after cache_keep_days.
+    "cache": True,
+    "cache_ttl_minutes": 60,
+    "cache_keep_days": 7,
+}
+
+
+def load_search_settings():
+    """Return the saved search settings merged over the defaults."""
+    settings = dict(DEFAULT_SETTINGS)
+    if CONFIG_PATH.is_file():
+        try:
+            with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if isinstance(saved, dict):
+                settings.update({key: value for key, value in saved.items() if key in DEFAULT_SETTINGS})
+        except (OSError, ValueError):
+            pass
+    return settings
+
+
+def save_search_settings(settings):
+    with open(CONFIG_PATH, 'w', encoding='utf-8') as f:
+        json.dump(settings, f, indent=2)
@@ -0,0 +1,174 @@
+"""Temporal sharding of searches over long date ranges.
+
+A search over several years of a daily product can run into the
+server's timeout. search_windows splits the date range of the query into
+windows, runs the window queries in parallel and yields their pages in
+chronological order of the windows, each product once. A window whose
+search times out is split in two and searched again, down to a minimum
+window length.
+"""
+
+import datetime
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+try:
+    from . import paging
+except ImportError:
+    from search import paging
+
+# Start and end keys of date ranges, as named by the HDA datasets
+DATE_RANGE_KEYS = [
+    ("start", "end"),
+    ("dtstart", "dtend"),
+    ("min_date", "max_date"),
+    ("startDate", "completionDate"),
+    ("creationDateStart", "creationDateEnd"),
+]
+
+# HTTP statuses of a search that took the server too long
+TIMEOUT_STATUSES = {408, 504}
+
+_PAGE = "page"
+_DONE = "done"
+_FAILED = "failed"
+
+
+def parse_datetime(value):
+    """A naive UTC datetime of an ISO date or datetime string, or None."""
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def format_datetime(value):
+    """The "yyyy-MM-ddTHH:mm:ss.zzzZ" form the plugin sends dates in."""
+    return value.strftime("%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}Z"
+
+
+def find_date_range(query):
+    """(start key, end key, start, end) of the date range of a query, or None when it has none."""
+    pairs = list(DATE_RANGE_KEYS)
+    pairs += [(key, key[:-len("_start")] + "_end") for key in query if key.endswith("_start")]
+    for start_key, end_key in pairs:
+        start = parse_datetime(query.get(start_key))
+        end = parse_datetime(query.get(end_key))
+        if start is not None and end is not None and start < end:
+            return start_key, end_key, start, end
+    return None
+
+
+def split_range(start, end, length):
+    """Consecutive (start, end) windows of at most `length` covering start..end."""
+    windows = []
+    while start < end:
+        window_end = min(end, start + length)
+        windows.append((start, window_end))
+        start = window_end
+    return windows
+
+
+def is_timeout(error):
+    if isinstance(error, (requests.Timeout, TimeoutError)):
+        return True
+    response = getattr(error, "response", None)
+    return isinstance(error, requests.HTTPError) and getattr(response, "status_code", None) in TIMEOUT_STATUSES
+
+
+class _Window:
+    def __init__(self, start, end, page_parallel=1):
+        self.start = start
+        self.end = end
+        self.page_parallel = page_parallel
+        self.items = queue.Queue()
+
+
+def search_windows(client, query, limit=None, window=datetime.timedelta(days=180),
+                   min_window=datetime.timedelta(days=1), parallel=4,
+                   items_per_page=paging.ITEMS_PER_PAGE, page_parallel=1, cancelled=lambda: False,
+                   prepare=True):
+    """Yield (features, total) for every page of a search split into date windows.
+
+    Queries without a date range are searched as by paging.search_pages.
+    Window searches run `parallel` at a time; pages of a later window wait
+    until the earlier windows are done. `total` is only known, and passed
+    on, while the range is searched as a single window. Features already
+    yielded are dropped, at most `limit` are yielded in all. A query that
+    went through paging.prepare_query already can be passed with `prepare`
+    False.
+    """
+    if prepare:
+        query = paging.prepare_query(client, query)
+    date_range = find_date_range(query)
+    if date_range is None:
+        yield from paging.search_pages(client, query, limit, items_per_page, page_parallel, cancelled, prepare=False)
+        return
+    start_key, end_key, start, end = date_range
+
+    stop = threading.Event()
+
+    def stopped():
+        return stop.is_set() or cancelled()
+
+    def run(window):
+        if stopped():
+            return
+        window_query = dict(query, **{start_key: format_datetime(window.start), end_key: format_datetime(window.end)})
+        try:
+            for features, total in paging.search_pages(
+                client, window_query, limit, items_per_page, window.page_parallel, stopped, prepare=False
+            ):
+                window.items.put((_PAGE, features, total))
+        except Exception as e:
+            window.items.put((_FAILED, e, None))
+        else:
+            window.items.put((_DONE, None, None))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, parallel), thread_name_prefix="search-window")
+
+    def submit(ranges, page_parallel=1):
+        windows = [_Window(window_start, window_end, page_parallel) for window_start, window_end in ranges]
+        for item in windows:
+            executor.submit(run, item)
+        return windows
+
+    def window_pages():
+        ranges = split_range(start, end, window) if window else [(start, end)]
+        single = len(ranges) == 1
+        pending = submit(ranges, page_parallel if single else 1)
+        try:
+            while pending:
+                current = pending[0]
+                try:
+                    kind, value, total = current.items.get(timeout=0.2)
+                except queue.Empty:
+                    if stopped():
+                        return
+                    continue
+                if kind == _DONE:
+                    pending.pop(0)
+                    continue
+                if kind == _FAILED:
+                    if not is_timeout(value) or current.end - current.start <= min_window:
+                        raise value
+                    # Search both halves of the window again; products already yielded are skipped
+                    single = False
+                    half = (current.end - current.start) / 2
+                    pending[0:1] = submit(split_range(current.start, current.end, half))
+                    continue
+                yield value, total if single else None
+        finally:
+            stop.set()
+            # Window searches still running stop after their current page
+            executor.shutdown(wait=False)
+
+    yield from paging.unique_features(window_pages(), limit, stopped)
@@ -0,0 +1,47 @@
+"""Choice of the search method from the search settings."""
+
+import datetime
+
+try:
+    from . import shards, tiles
+except ImportError:
+    from search import shards, tiles
+
+
+def run_search(client, query, limit, settings, cancelled=lambda: False):
+    """Yield (features, total) for every page of a search, run as the search settings ask."""
+    shard_days = float(settings["shard_days"])
+    window = datetime.timedelta(days=shard_days) if shard_days > 0 else None
+    min_window = datetime.timedelta(hours=float(settings["shard_min_hours"]))
+    items_per_page = int(settings["page_size"])
+
+    if settings["tiles"] and tiles.tileable_bbox(query) is not None:
+        # The tiles are the parallel searches; each tile is searched one window and page at a time
+        def search_tile(tile_query, stopped):
+            return shards.search_windows(
+                client, tile_query, limit, window=window, min_window=min_window, parallel=1,
+                items_per_page=items_per_page, page_parallel=1, cancelled=stopped, prepare=False,
+            )
+
+        return tiles.search_tiles(
+            client,
+            query,
+            limit,
+            target=int(settings["tile_target"]),
+            min_size=float(settings["tile_min_degrees"]),
+            parallel=int(settings["tile_parallel"]),
+            tile_search=search_tile,
+            cancelled=cancelled,
+        )
+
+    return shards.search_windows(
+        client,
+        query,
+        limit,
+        window=window,
+        min_window=min_window,
+        parallel=int(settings["shard_parallel"]),
+        items_per_page=items_per_page,
+        page_parallel=int(settings["page_parallel"]),
+        cancelled=cancelled,
+    )
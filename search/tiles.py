@@ -0,0 +1,153 @@
+"""Spatial tiling of searches over large bounding boxes.
+
+A continental bounding box can match more products than one search
+handles before the server's timeout. search_tiles first asks for the
+number of matches of the box. While a box has more than a target number
+of matches it is split into four, so the tiles are small where products
+are dense and large where they are sparse. The tiles are searched in
+parallel, every product is yielded once, and tiles that fail do not
+lose the results of the others: PartialSearchError is raised at the end,
+after every other tile has been searched.
+"""
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from . import paging
+except ImportError:
+    from search import paging
+
+_PAGE = "page"
+_SPLIT = "split"
+_DONE = "done"
+_FAILED = "failed"
+
+
+class PartialSearchError(Exception):
+    """Some tiles of a tiled search failed; the results of the other tiles were yielded."""
+
+    def __init__(self, failures, tiles):
+        self.failures = failures
+        self.tiles = tiles
+        first = failures[0][1]
+        super().__init__(f"{len(failures)} of {tiles} search tiles failed ({first}); the results of the other tiles are listed.")
+
+
+def split_bbox(bbox):
+    """The four quarters of a [west, south, east, north] box."""
+    west, south, east, north = bbox
+    middle_x = (west + east) / 2
+    middle_y = (south + north) / 2
+    return [
+        [west, south, middle_x, middle_y],
+        [middle_x, south, east, middle_y],
+        [west, middle_y, middle_x, north],
+        [middle_x, middle_y, east, north],
+    ]
+
+
+def tileable_bbox(query):
+    """The bounding box of a query as four floats, or None when it cannot be tiled."""
+    bbox = query.get("bbox")
+    if not isinstance(bbox, (list, tuple)) or len(bbox) != 4:
+        return None
+    try:
+        west, south, east, north = (float(value) for value in bbox)
+    except (TypeError, ValueError):
+        return None
+    # Boxes across the antimeridian have west > east
+    if west >= east or south >= north:
+        return None
+    return [west, south, east, north]
+
+
+def count_matches(client, query):
+    """Number of matches of a prepared query, or None when the server does not tell."""
+    return paging.page_total(paging.fetch_page(client, query, 0, 1))
+
+
+def search_tiles(client, query, limit=None, target=2000, min_size=0.5, parallel=4,
+                 tile_search=None, cancelled=lambda: False):
+    """Yield (features, total) for the pages of a search split into bounding box tiles.
+
+    Boxes with more than `target` matches are quartered, down to tiles
+    `min_size` degrees wide or high. `tile_search(query, cancelled)`
+    searches one tile and yields (features, total) pages; by default it
+    is paging.search_pages. `total` is the number of matches of the whole
+    box. Queries without a usable bbox are searched by `tile_search`
+    directly.
+    """
+    query = paging.prepare_query(client, query)
+    if tile_search is None:
+        def tile_search(tile_query, stopped):
+            return paging.search_pages(client, tile_query, limit, cancelled=stopped, prepare=False)
+
+    bbox = tileable_bbox(query)
+    if bbox is None:
+        yield from tile_search(query, cancelled)
+        return
+
+    stop = threading.Event()
+    results = queue.Queue()
+
+    def stopped():
+        return stop.is_set() or cancelled()
+
+    def run(tile, matches=None):
+        if stopped():
+            return
+        try:
+            tile_query = dict(query, bbox=tile)
+            if matches is None:
+                matches = count_matches(client, tile_query)
+            small = tile[2] - tile[0] <= min_size or tile[3] - tile[1] <= min_size
+            if matches is not None and matches > target and not small:
+                results.put((_SPLIT, tile, split_bbox(tile)))
+                return
+            if matches != 0:
+                for features, _ in tile_search(tile_query, stopped):
+                    results.put((_PAGE, tile, features))
+        except Exception as e:
+            results.put((_FAILED, tile, e))
+        else:
+            results.put((_DONE, tile, None))
+
+    def tile_pages():
+        executor = ThreadPoolExecutor(max_workers=max(1, parallel), thread_name_prefix="search-tile")
+        executor.submit(run, bbox, total)
+        outstanding = 1
+        tiles = 1
+        failures = []
+        try:
+            while outstanding:
+                try:
+                    kind, tile, value = results.get(timeout=0.2)
+                except queue.Empty:
+                    if stopped():
+                        return
+                    continue
+                if kind == _SPLIT:
+                    for child in value:
+                        executor.submit(run, child)
+                    outstanding += len(value) - 1
+                    tiles += len(value) - 1
+                    continue
+                if kind in (_DONE, _FAILED):
+                    outstanding -= 1
+                    if kind == _FAILED:
+                        failures.append((tile, value))
+                    continue
+                yield value, total
+        finally:
+            stop.set()
+            # Tile searches still running stop after their current page
+            executor.shutdown(wait=False)
+        if failures:
+            if len(failures) == tiles:
+                raise failures[0][1]
+            raise PartialSearchError(failures, tiles)
+
+    total = count_matches(client, query)
+    yield from paging.unique_features(tile_pages(), limit, stopped)
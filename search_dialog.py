@@ -0,0 +1,73 @@
+import os
+
+try:
+    from .qt_compat import QDialog, QIcon, QStyle, uic
+    from .search.settings import load_search_settings, save_search_settings
+except ImportError:
+    from qt_compat import QDialog, QIcon, QStyle, uic
+    from search.settings import load_search_settings, save_search_settings
+
+SEARCH_UI_PATH = os.path.join(os.path.dirname(__file__), "resources", "search_dialog.ui")
+
+FORM_CLASS, _ = uic.loadUiType(SEARCH_UI_PATH)
+
+
+class SearchDialog(QDialog, FORM_CLASS):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setupUi(self)
+
+        icon_path = os.path.join(os.path.dirname(__file__), 'resources', 'icon.png')
+        self.setWindowIcon(QIcon(icon_path))
+
+        self.settings = load_search_settings()
+        self.spinPageSize.setValue(int(self.settings["page_size"]))
+        self.spinPageParallel.setValue(int(self.settings["page_parallel"]))
+        self.spinTimeout.setValue(int(self.settings["timeout_minutes"]))
+        self.spinShardDays.setValue(int(self.settings["shard_days"]))
+        self.spinShardParallel.setValue(int(self.settings["shard_parallel"]))
+        self.spinShardMin.setValue(int(self.settings["shard_min_hours"]))
+        self.checkTiles.setChecked(bool(self.settings["tiles"]))
+        self.spinTileTarget.setValue(int(self.settings["tile_target"]))
+        self.spinTileMin.setValue(float(self.settings["tile_min_degrees"]))
+        self.spinTileParallel.setValue(int(self.settings["tile_parallel"]))
+        self.checkCache.setChecked(bool(self.settings["cache"]))
+        self.spinCacheTtl.setValue(int(self.settings["cache_ttl_minutes"]))
+        self.spinCacheKeep.setValue(int(self.settings["cache_keep_days"]))
+        self.spinShardDays.valueChanged.connect(self.update_enabled)
+        self.checkTiles.toggled.connect(self.update_enabled)
+        self.checkCache.toggled.connect(self.update_enabled)
+        self.update_enabled()
+
+        self.btnSave.setIcon(self.style().standardIcon(QStyle.SP_DialogSaveButton))
+        self.btnCancel.setIcon(self.style().standardIcon(QStyle.SP_DialogCancelButton))
+
+        self.btnSave.clicked.connect(self.save)
+        self.btnCancel.clicked.connect(self.reject)
+
+    def update_enabled(self):
+        sharded = self.spinShardDays.value() > 0
+        self.spinShardParallel.setEnabled(sharded)
+        tiled = self.checkTiles.isChecked()
+        for widget in (self.spinTileTarget, self.spinTileMin, self.spinTileParallel):
+            widget.setEnabled(tiled)
+        cache = self.checkCache.isChecked()
+        self.spinCacheTtl.setEnabled(cache)
+        self.spinCacheKeep.setEnabled(cache)
+
+    def save(self):
+        self.settings["page_size"] = self.spinPageSize.value()
+        self.settings["page_parallel"] = self.spinPageParallel.value()
+        self.settings["timeout_minutes"] = self.spinTimeout.value()
+        self.settings["shard_days"] = self.spinShardDays.value()
+        self.settings["shard_parallel"] = self.spinShardParallel.value()
+        self.settings["shard_min_hours"] = self.spinShardMin.value()
+        self.settings["tiles"] = self.checkTiles.isChecked()
+        self.settings["tile_target"] = self.spinTileTarget.value()
+        self.settings["tile_min_degrees"] = self.spinTileMin.value()
+        self.settings["tile_parallel"] = self.spinTileParallel.value()
+        self.settings["cache"] = self.checkCache.isChecked()
+        self.settings["cache_ttl_minutes"] = self.spinCacheTtl.value()
+        self.settings["cache_keep_days"] = self.spinCacheKeep.value()
+        save_search_settings(self.settings)
+        self.accept()
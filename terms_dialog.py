@@ -1,5 +1,9 @@
 import os
-import requests
+
+try:
+    from .http_session import get_session
+except ImportError:
+    from http_session import get_session
 
 try:
     from .qt_compat import (
@@ -129,7 +133,7 @@ class TermsDialog(QDialog, FORM_CLASS):
                     "accept": "application/json"
                 }
 
-                response = requests.delete(url, headers=headers, timeout=REQUEST_TIMEOUT)
+                response = get_session().delete(url, headers=headers, timeout=REQUEST_TIMEOUT)
                 response.raise_for_status()  
 
             except Exception as e: